@@ -1,39 +1,150 @@
 import os
 import json
+import time
 import re
+import copy
+import contextlib
 import asyncio
+import dataclasses
+import contextvars
 import httpx
+from concurrent.futures import BrokenExecutor
 from dotenv import load_dotenv
-from typing import List, Dict, Any
-from .prompts import get_classification_prompt, get_response_prompt
-from .nlp_processor import preprocess_email, extract_keywords
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+from .llm_backend import get_backend, meter_add
+from .scheduler import SCHEDULER, estimate_tokens
+from .cache import RESULT_CACHE, cache_key, cache_bypass
+from .workers import run_in_pool
+from .local_classifier import classify_local
+from .email_trim import trim_email
+from .dedup import DEDUP_ENABLED, DuplicateIndex, is_near_empty, simple_tokens
+from .metrics import Counter, Histogram, record_stage, span, timed
+from .prompts import (
+    get_classification_prompt, get_batch_classification_prompt, get_response_prompt,
+    get_classification_and_response_prompt, PROMPT_VERSION
+)
+from .nlp_processor import analyze_email, NlpResult
 
 load_dotenv()
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-API_URL = "https://api.groq.com/openai/v1/chat/completions"
-MODEL = "llama-3.1-8b-instant"
 
 USE_NLP_PREPROCESSING = os.getenv("USE_NLP_PREPROCESSING", "true").lower() == "true"
 
+BATCH_CLASSIFICATION = os.getenv("BATCH_CLASSIFICATION", "false").lower() == "true"
+BATCH_TOKEN_BUDGET = int(os.getenv("BATCH_TOKEN_BUDGET", "3000"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "10"))
+BATCH_TOKENS_PER_ITEM = 80
+
+# Classificação e resposta em uma só chamada ao LLM (fora do modo em lote).
+COMBINED_PROMPT = os.getenv("COMBINED_PROMPT", "false").lower() == "true"
+COMBINED_MAX_TOKENS = 750
+
+# Prazo padrão por requisição (0 = sem prazo); o cliente pode pedir outro até REQUEST_DEADLINE_MAX_SECONDS.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "120"))
+REQUEST_DEADLINE_MAX_SECONDS = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "600"))
+
+# Instante (time.monotonic) em que a requisição atual deixa de esperar pelos emails pendentes.
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+CATEGORIAS = {"PRODUTIVO", "IMPRODUTIVO"}
+
+LLM_SKIPPED = Counter("llm_skipped_total", "Emails resolvidos sem chamar o LLM")
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens consumidos segundo o campo usage da API")
+LLM_ERRORS = Counter("llm_errors_total", "Falhas de chamadas ao LLM por tipo")
+COMBINED_FALLBACKS = Counter("llm_combined_fallback_total", "Chamadas combinadas que voltaram ao fluxo de duas chamadas")
+LLM_CANCELLED = Counter("llm_cancelled_total", "Chamadas ao LLM canceladas na fila ou em andamento")
+REQUESTS_ABORTED = Counter("requests_aborted_total", "Requisições interrompidas antes de concluir todos os emails")
+NLP_FAILURES = Counter("nlp_failures_total", "Pré-processamentos NLP que falharam; o email segue pelo texto bruto")
+EMAILS_TIMED_OUT = Counter("emails_timed_out_total", "Emails devolvidos com status tempo_esgotado")
+LLM_TTFT = Histogram("llm_ttft_seconds", "Tempo até o primeiro token nas chamadas em streaming")
+
+def _llm_enabled() -> bool:
+    return get_backend().available
+
+
+def _llm_slot(backend, messages: List[Dict[str, str]], max_tokens: int):
+    if not backend.rate_limited:
+        return contextlib.nullcontext()
+    return SCHEDULER.slot(estimate_tokens(messages) + max_tokens)
+
+
+def _count_error(e: Exception) -> None:
+    if isinstance(e, httpx.HTTPStatusError):
+        LLM_ERRORS.inc(tipo=f"http_{e.response.status_code}")
+    else:
+        LLM_ERRORS.inc(tipo=type(e).__name__)
+
+
+def _record_usage(usage: Dict[str, Any]) -> None:
+    LLM_TOKENS.inc(usage.get("prompt_tokens", 0), tipo="prompt")
+    LLM_TOKENS.inc(usage.get("completion_tokens", 0), tipo="completion")
+    meter_add(
+        chamadas=1,
+        tokens_entrada=usage.get("prompt_tokens", 0),
+        tokens_saida=usage.get("completion_tokens", 0),
+    )
+
+
 async def _call_groq(messages: List[Dict[str, str]], temperature=0.2, max_tokens=500) -> Any:
-    if not GROQ_API_KEY:
+    backend = get_backend()
+    if not backend.available:
         return None
 
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": MODEL,
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-    }
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.post(API_URL, headers=headers, json=payload)
-        resp.raise_for_status()
-        return resp.json()
+    started = time.perf_counter()
+    etapa = "fila"
+    try:
+        async with _llm_slot(backend, messages, max_tokens):
+            record_stage("fila_llm", time.perf_counter() - started)
+            etapa = "em_andamento"
+            try:
+                with span("llm_http"):
+                    j = await backend.chat(messages, temperature=temperature, max_tokens=max_tokens)
+            except Exception as e:
+                _count_error(e)
+                raise
+    except asyncio.CancelledError:
+        LLM_CANCELLED.inc(etapa=etapa)
+        raise
+    _record_usage(j.get("usage") or {})
+    return j
+
+
+async def _stream_groq(messages: List[Dict[str, str]], temperature=0.2, max_tokens=500) -> AsyncIterator[str]:
+    """Como _call_groq, mas gera o texto em pedaços à medida que o provedor os envia."""
+    backend = get_backend()
+    if not backend.available:
+        return
+
+    started = time.perf_counter()
+    usage: Dict[str, Any] = {}
+    etapa = "fila"
+    try:
+        async with _llm_slot(backend, messages, max_tokens):
+            record_stage("fila_llm", time.perf_counter() - started)
+            etapa = "em_andamento"
+            sent = time.perf_counter()
+            first = True
+            try:
+                with span("llm_http"):
+                    async for chunk in backend.chat_stream(messages, temperature=temperature, max_tokens=max_tokens):
+                        usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or usage
+                        for choice in chunk.get("choices") or []:
+                            delta = (choice.get("delta") or {}).get("content")
+                            if not delta:
+                                continue
+                            if first:
+                                first = False
+                                ttft = time.perf_counter() - sent
+                                LLM_TTFT.observe(ttft)
+                                record_stage("llm_primeiro_token", ttft)
+                            yield delta
+            except Exception as e:
+                _count_error(e)
+                raise
+    except asyncio.CancelledError:
+        LLM_CANCELLED.inc(etapa=etapa)
+        raise
+    _record_usage(usage)
 
 
 def _parse_classification(raw_text: str) -> Dict[str, Any]:
@@ -56,6 +167,15 @@ def _parse_classification(raw_text: str) -> Dict[str, Any]:
             "razao": f"Resposta do modelo não foi JSON válido. Trecho: {raw_text[:200]}"
         }
 
+    result = _classification_from_dict(parsed)
+    # Prompt combinado: a resposta sugerida vem junto; ausente, o chamador a gera à parte.
+    resposta = parsed.get("resposta")
+    if isinstance(resposta, str) and resposta.strip():
+        result["resposta"] = resposta.strip()
+    return result
+
+
+def _classification_from_dict(parsed: Dict[str, Any]) -> Dict[str, Any]:
     categoria = str(parsed.get("categoria", "IMPRODUTIVO")).upper()
     try:
         confianca = int(parsed.get("confianca", 0))
@@ -68,112 +188,670 @@ def _parse_classification(raw_text: str) -> Dict[str, Any]:
     return {"categoria": categoria, "confianca": max(0, min(confianca, 100)), "razao": razao}
 
 
-async def classify_one(texto: str) -> Dict[str, Any]:
+def _parse_batch_classification(raw_text: str, expected: int) -> List[Optional[Dict[str, Any]]]:
+    """Uma entrada por email; None onde o item faltou ou é inválido (o chamador refaz individualmente)."""
+    try:
+        parsed = json.loads(raw_text)
+    except Exception:
+        m = re.search(r"\[.*\]", raw_text, re.DOTALL)
+        try:
+            parsed = json.loads(m.group(0)) if m else None
+        except Exception:
+            parsed = None
+
+    if isinstance(parsed, dict):
+        parsed = next((v for v in parsed.values() if isinstance(v, list)), None)
+    if not isinstance(parsed, list):
+        return [None] * expected
+
+    # Posiciona pelo id só se os ids forem exatamente 1..n; ids fora disso (ex.: começando em 0)
+    # deslocariam as classificações. Nesse caso vale a ordem do array, se o tamanho bater.
+    ids = []
+    for entry in parsed:
+        try:
+            ids.append(int(entry.get("id")) if isinstance(entry, dict) else None)
+        except (TypeError, ValueError):
+            ids.append(None)
+    if sorted(i for i in ids if i is not None) == list(range(1, expected + 1)) and None not in ids:
+        positions = [i - 1 for i in ids]
+    elif len(parsed) == expected:
+        positions = list(range(expected))
+    else:
+        return [None] * expected
+
+    results: List[Optional[Dict[str, Any]]] = [None] * expected
+    for idx, entry in zip(positions, parsed):
+        if not isinstance(entry, dict):
+            continue
+        if str(entry.get("categoria", "")).upper() not in CATEGORIAS or "confianca" not in entry:
+            continue
+        results[idx] = _classification_from_dict(entry)
+    return results
+
+
+def _normalize_for_cache(texto: str) -> str:
+    return " ".join(texto.lower().split())
+
+
+def _with_nlp(result: Dict[str, Any], nlp_data: Optional[NlpResult]) -> Dict[str, Any]:
+    if nlp_data:
+        result["nlp_stats"] = nlp_data.stats
+        result["keywords"] = list(nlp_data.keywords)
+    return result
+
+
+def _llm_error(razao: str, nlp_data: Optional[NlpResult]) -> Dict[str, Any]:
+    return {
+        "categoria": "IMPRODUTIVO",
+        "confianca": 0,
+        "razao": razao,
+        "status": "erro",
+        "nlp_stats": nlp_data.stats if nlp_data else None
+    }
+
+
+async def _prepare_classification(texto: str) -> Tuple[Optional[NlpResult], str, str, Optional[Dict[str, Any]]]:
     nlp_data = None
-    texto_para_ai = texto
+    corpo = trim_email(texto)
+    texto_para_ai = corpo
+
+    if USE_NLP_PREPROCESSING and corpo.strip():
+        try:
+            with span("nlp"):
+                nlp_data = await run_in_pool("nlp", analyze_email, corpo)
+        except asyncio.TimeoutError:
+            NLP_FAILURES.inc(motivo="timeout")
+        except BrokenExecutor:
+            NLP_FAILURES.inc(motivo="pool")
+        except Exception:
+            # Sem NLP o email ainda é classificável, como com USE_NLP_PREPROCESSING=false.
+            NLP_FAILURES.inc(motivo="erro")
+        if nlp_data:
+            nlp_data = dataclasses.replace(
+                nlp_data, stats={**nlp_data.stats, "original_length": len(texto), "trimmed_length": len(corpo)}
+            )
+            texto_para_ai = f"{corpo}\n\n[Palavras-chave identificadas: {', '.join(nlp_data.keywords)}]"
+
+    if nlp_data:
+        local = classify_local(nlp_data.stemmed or [])
+        if local:
+            return nlp_data, texto_para_ai, "", _with_nlp(local, nlp_data)
+
+    texto_normalizado = (nlp_data.processed if nlp_data else "") or _normalize_for_cache(corpo)
+    key = cache_key(
+        "classificacao", texto_normalizado,
+        model=get_backend().model, prompt_version=PROMPT_VERSION, nlp=USE_NLP_PREPROCESSING,
+        temperature=0.0, max_tokens=300,
+    )
+    return nlp_data, texto_para_ai, key, None
 
-    if USE_NLP_PREPROCESSING and texto.strip():
-        nlp_data = preprocess_email(texto, apply_stem=True)
-        keywords = extract_keywords(texto, top_n=5)
-        texto_para_ai = f"{texto}\n\n[Palavras-chave identificadas: {', '.join(keywords)}]"
+
+@timed("classificacao")
+async def classify_one(texto: str) -> Dict[str, Any]:
+    nlp_data, texto_para_ai, key, early = await _prepare_classification(texto)
+    if early:
+        return early
 
     prompt = get_classification_prompt(texto_para_ai)
 
-    if not GROQ_API_KEY:
+    if not _llm_enabled():
         return {
             "categoria": "IMPRODUTIVO",
             "confianca": 0,
-            "razao": "GROQ_API_KEY ausente (fallback)",
-            "nlp_stats": nlp_data['stats'] if nlp_data else None
+            "razao": "LLM não configurado: defina GROQ_API_KEY ou LLM_BASE_URL (fallback)",
+            "nlp_stats": nlp_data.stats if nlp_data else None
         }
 
-    try:
+    async def call() -> Dict[str, Any]:
         j = await _call_groq([{"role": "user", "content": prompt}], temperature=0.0, max_tokens=300)
         raw = j["choices"][0]["message"]["content"].strip()
-        result = _parse_classification(raw)
-
-        if nlp_data:
-            result["nlp_stats"] = nlp_data['stats']
-            result["keywords"] = extract_keywords(texto, top_n=5)
+        return _parse_classification(raw)
 
-        return result
+    try:
+        result = dict(await RESULT_CACHE.get_or_compute(
+            key, call, tipo="classificacao", should_store=lambda r: r.get("confianca", 0) > 0
+        ))
+        return _with_nlp(result, nlp_data)
     except httpx.HTTPStatusError as e:
-        return {
-            "categoria": "IMPRODUTIVO",
-            "confianca": 0,
-            "razao": f"Erro LLM: {e.response.status_code}",
-            "nlp_stats": nlp_data['stats'] if nlp_data else None
-        }
+        return _llm_error(f"Erro LLM: {e.response.status_code}", nlp_data)
     except Exception as e:
-        return {
-            "categoria": "IMPRODUTIVO",
-            "confianca": 0,
-            "razao": f"Erro LLM: {str(e)}",
-            "nlp_stats": nlp_data['stats'] if nlp_data else None
-        }
+        return _llm_error(f"Erro LLM: {str(e)}", nlp_data)
+
+
+@timed("classificacao_resposta")
+async def classify_and_draft(texto: str) -> Dict[str, Any]:
+    """Classifica e redige a resposta em uma só chamada; o resultado traz "resposta" quando o modelo a enviou."""
+    nlp_data, texto_para_ai, _, early = await _prepare_classification(texto)
+    if early:
+        return early
+    if not _llm_enabled():
+        return await classify_one(texto)
+
+    # A resposta depende de detalhes (números, nomes, datas) que o texto processado pelo NLP descarta:
+    # como em generate_one, a chave usa o texto completo, só normalizado.
+    key = cache_key(
+        "classificacao_resposta", _normalize_for_cache(trim_email(texto)),
+        model=get_backend().model, prompt_version=PROMPT_VERSION, nlp=USE_NLP_PREPROCESSING,
+        temperature=0.2, max_tokens=COMBINED_MAX_TOKENS,
+    )
+
+    prompt = get_classification_and_response_prompt(texto_para_ai)
+
+    async def call() -> Dict[str, Any]:
+        j = await _call_groq([{"role": "user", "content": prompt}], temperature=0.2, max_tokens=COMBINED_MAX_TOKENS)
+        raw = j["choices"][0]["message"]["content"].strip()
+        return _parse_classification(raw)
+
+    try:
+        result = dict(await RESULT_CACHE.get_or_compute(
+            key, call, tipo="classificacao_resposta", should_store=lambda r: bool(r.get("resposta"))
+        ))
+    except Exception:
+        result = {"confianca": 0}
+    if result.get("confianca", 0) <= 0:
+        # Falha, JSON inválido ou truncado: volta ao fluxo de duas chamadas.
+        COMBINED_FALLBACKS.inc(motivo="classificacao")
+        return await classify_one(texto)
+    if not result.get("resposta"):
+        COMBINED_FALLBACKS.inc(motivo="sem_resposta")
+    return _with_nlp(result, nlp_data)
+
+
+def plan_batches(textos: List[str], token_budget: int = BATCH_TOKEN_BUDGET,
+                 max_size: int = BATCH_MAX_SIZE) -> List[List[int]]:
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for i, texto in enumerate(textos):
+        cost = len(texto) // 4 + BATCH_TOKENS_PER_ITEM
+        if current and (used + cost > token_budget or len(current) >= max_size):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _classify_chunk(textos_para_ai: List[str]) -> List[Optional[Dict[str, Any]]]:
+    if len(textos_para_ai) == 1:
+        return [None]
+    prompt = get_batch_classification_prompt(textos_para_ai)
+    try:
+        j = await _call_groq(
+            [{"role": "user", "content": prompt}],
+            temperature=0.0,
+            max_tokens=BATCH_TOKENS_PER_ITEM * len(textos_para_ai) + 50
+        )
+        raw = j["choices"][0]["message"]["content"].strip()
+    except Exception:
+        return [None] * len(textos_para_ai)
+    return _parse_batch_classification(raw, len(textos_para_ai))
+
+
+@timed("classificacao_lote")
+async def classify_batch(textos: List[str]) -> List[Dict[str, Any]]:
+    """Classifica vários emails com um prompt por lote; itens ausentes ou inválidos voltam para classify_one."""
+    if not _llm_enabled() or len(textos) <= 1:
+        return list(await asyncio.gather(*(classify_one(t) for t in textos)))
+
+    prepared = await asyncio.gather(*(_prepare_classification(t) for t in textos))
+    results: List[Optional[Dict[str, Any]]] = [None] * len(textos)
+    pending: List[int] = []
+    use_cache = RESULT_CACHE.enabled and not cache_bypass.get()
+
+    for i, (nlp_data, _, key, early) in enumerate(prepared):
+        if early:
+            results[i] = early
+            continue
+        cached = await RESULT_CACHE.get(key, "classificacao") if use_cache else None
+        if cached is not None:
+            results[i] = _with_nlp(dict(cached), nlp_data)
+        else:
+            pending.append(i)
 
+    async def run_chunk(chunk: List[int]) -> None:
+        entries = await _classify_chunk([prepared[i][1] for i in chunk])
+        fallback = []
+        for i, entry in zip(chunk, entries):
+            if entry is None:
+                fallback.append(i)
+                continue
+            if use_cache and entry["confianca"] > 0:
+                await RESULT_CACHE.set(prepared[i][2], dict(entry))
+            results[i] = _with_nlp(entry, prepared[i][0])
+        retried = await asyncio.gather(*(classify_one(textos[i]) for i in fallback))
+        for i, result in zip(fallback, retried):
+            results[i] = result
 
-async def generate_one(texto: str, categoria: str) -> str:
+    chunks = plan_batches([prepared[i][1] for i in pending])
+    await asyncio.gather(*(run_chunk([pending[p] for p in chunk]) for chunk in chunks))
+    return results
+
+
+@timed("geracao")
+async def generate_one(texto: str, categoria: str, on_delta: Optional[Callable[[str], None]] = None) -> str:
+    """Gera a resposta sugerida; com `on_delta`, pede streaming ao provedor e repassa cada pedaço do texto."""
     temperature = 0.5 if categoria == "PRODUTIVO" else 0.3
     max_tokens = 450 if categoria == "PRODUTIVO" else 350
 
+    texto = trim_email(texto)
     prompt = get_response_prompt(texto, categoria)
 
-    if not GROQ_API_KEY:
+    if not _llm_enabled():
         return ""
 
-    try:
+    key = cache_key(
+        "resposta", _normalize_for_cache(texto),
+        categoria=categoria, model=get_backend().model, prompt_version=PROMPT_VERSION,
+        temperature=temperature, max_tokens=max_tokens,
+    )
+
+    async def call() -> str:
         j = await _call_groq(
             [{"role": "user", "content": prompt}],
             temperature=temperature,
             max_tokens=max_tokens
         )
         return j["choices"][0]["message"]["content"].strip()
+
+    streamed = False
+
+    async def call_stream() -> str:
+        nonlocal streamed
+        partes = []
+        async for delta in _stream_groq(
+            [{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens
+        ):
+            streamed = True
+            partes.append(delta)
+            on_delta(delta)
+        return "".join(partes).strip()
+
+    try:
+        resposta = await RESULT_CACHE.get_or_compute(
+            key, call if on_delta is None else call_stream, tipo="resposta", should_store=bool
+        )
     except Exception:
         return ""
+    # Acerto de cache ou chamada coalescida: o texto chega inteiro, em um só pedaço.
+    if on_delta is not None and not streamed and resposta:
+        on_delta(resposta)
+    return resposta
 
 
-async def process_texts(items: List[Dict[str, str]]) -> List[Dict]:
-    classify_tasks = [classify_one(it["texto"]) for it in items]
-    classes = await asyncio.gather(*classify_tasks, return_exceptions=True)
+def _build_result(it: Dict[str, str], cls: Any, resp: Any) -> Dict:
+    if isinstance(cls, Exception):
+        cls = {"categoria": "IMPRODUTIVO", "confianca": 0, "razao": str(cls), "status": "erro"}
+    if isinstance(resp, Exception):
+        resp_text = ""
+    else:
+        resp_text = str(resp or "")
 
-    gen_tasks = []
-    for it, cls in zip(items, classes):
-        if isinstance(cls, Exception):
-            categoria = "IMPRODUTIVO"
-        else:
-            categoria = cls.get("categoria", "IMPRODUTIVO")
-        gen_tasks.append(generate_one(it["texto"], categoria))
-    responses = await asyncio.gather(*gen_tasks, return_exceptions=True)
-
-    result = []
-    for it, cls, resp in zip(items, classes, responses):
-        if isinstance(cls, Exception):
-            cls = {"categoria": "IMPRODUTIVO", "confianca": 0, "razao": str(cls)}
-        if isinstance(resp, Exception):
-            resp_text = ""
-        else:
-            resp_text = str(resp or "")
+    nlp_stats = cls.pop("nlp_stats", None) if isinstance(cls, dict) else None
+    keywords = cls.pop("keywords", None) if isinstance(cls, dict) else None
+
+    item_result = {
+        "arquivo": it.get("arquivo", "texto"),
+        "classificacao": {
+            "categoria": str(cls.get("categoria", "IMPRODUTIVO")).upper(),
+            "confianca": int(cls.get("confianca", 0) or 0),
+            "razao": str(cls.get("razao", "") or "")
+        },
+        "resposta": resp_text,
+        "status": cls.get("status", "ok")
+    }
+
+    if it.get("extracao"):
+        item_result["extracao"] = it["extracao"]
+
+    if nlp_stats:
+        item_result["nlp_processing"] = {
+            "stats": nlp_stats,
+            "keywords": keywords or []
+        }
+
+    return item_result
+
+
+# Recebe eventos parciais de um email: {"arquivo", "classificacao"} e depois {"delta"} a cada pedaço da resposta.
+PartialCallback = Callable[[Dict[str, Any]], None]
 
-        nlp_stats = cls.pop("nlp_stats", None) if isinstance(cls, dict) else None
-        keywords = cls.pop("keywords", None) if isinstance(cls, dict) else None
 
-        item_result = {
+async def process_one(
+    it: Dict[str, str],
+    classificacao: Optional[Awaitable[Dict[str, Any]]] = None,
+    on_partial: Optional[PartialCallback] = None,
+) -> Dict:
+    try:
+        if classificacao is not None:
+            cls = await classificacao
+        elif COMBINED_PROMPT:
+            cls = await classify_and_draft(it["texto"])
+        else:
+            cls = await classify_one(it["texto"])
+    except Exception as e:
+        cls = e
+
+    rascunho = cls.pop("resposta", None) if isinstance(cls, dict) else None
+    categoria = "IMPRODUTIVO" if isinstance(cls, Exception) else cls.get("categoria", "IMPRODUTIVO")
+    on_delta = None
+    if on_partial is not None and not isinstance(cls, Exception):
+        on_partial({
             "arquivo": it.get("arquivo", "texto"),
             "classificacao": {
-                "categoria": str(cls.get("categoria", "IMPRODUTIVO")).upper(),
+                "categoria": str(categoria).upper(),
                 "confianca": int(cls.get("confianca", 0) or 0),
-                "razao": str(cls.get("razao", "") or "")
+                "razao": str(cls.get("razao", "") or ""),
             },
-            "resposta": resp_text
-        }
+        })
+
+        def on_delta(delta: str) -> None:
+            on_partial({"delta": delta})
+
+    if rascunho:
+        resp = rascunho
+        if on_delta is not None:
+            on_delta(rascunho)
+    else:
+        try:
+            resp = await generate_one(it["texto"], categoria, on_delta)
+        except Exception as e:
+            resp = e
+
+    return _build_result(it, cls, resp)
+
+
+async def _indexed(idx: int, coro: Awaitable[Dict]) -> Tuple[int, Dict]:
+    return idx, await coro
 
-        if nlp_stats:
-            item_result["nlp_processing"] = {
-                "stats": nlp_stats,
-                "keywords": keywords or []
-            }
 
-        result.append(item_result)
+async def _guarded(idx: int, job: Awaitable[Tuple[int, Dict]], it: Dict[str, str]) -> Tuple[int, Dict]:
+    """Uma exceção inesperada vira resultado de erro do email, sem derrubar o gerador que entrega os demais."""
+    try:
+        return await job
+    except Exception as e:
+        return idx, _build_result(it, e, "")
+
+
+async def _pick(batch: "asyncio.Future[List[Dict[str, Any]]]", pos: int) -> Dict[str, Any]:
+    return (await asyncio.shield(batch))[pos]
+
+
+# Marca em `extracao` que explica a falta de texto -> (status, razão); sem marca, o email veio vazio.
+_EMPTY_REASONS = (
+    ("falha_extracao", "erro", "Falha ao extrair o texto do arquivo (corrompido, formato inválido ou tempo limite)."),
+    (
+        "formato_nao_suportado", "formato_nao_suportado",
+        "Formato não suportado nesta instalação (ex.: .msg do Outlook sem o pacote extract-msg).",
+    ),
+    ("limite_excedido", "limite_excedido", "Arquivo excede o tamanho máximo aceito (MAX_FILE_BYTES); o conteúdo não foi lido."),
+)
 
-    return result
\ No newline at end of file
+
+def _empty_result(it: Dict[str, str]) -> Dict:
+    extracao = it.get("extracao") or {}
+    motivo, status, razao = next(
+        (marca for marca in _EMPTY_REASONS if extracao.get(marca[0])),
+        ("vazio", "vazio", "Nenhum texto aproveitável foi extraído; a análise foi ignorada."),
+    )
+    LLM_SKIPPED.inc(motivo=motivo)
+    cls = {
+        "categoria": "IMPRODUTIVO",
+        "confianca": 0,
+        "razao": razao,
+        "status": status,
+    }
+    return _build_result(it, cls, "")
+
+
+def _timed_out_result(it: Dict[str, str]) -> Dict:
+    EMAILS_TIMED_OUT.inc()
+    cls = {
+        "categoria": "IMPRODUTIVO",
+        "confianca": 0,
+        "razao": "Prazo da requisição esgotado antes da conclusão; o processamento deste email foi cancelado.",
+        "status": "tempo_esgotado",
+    }
+    return _build_result(it, cls, "")
+
+
+def _settled_result(task: "asyncio.Future[Tuple[int, Dict]]", it: Dict[str, str]) -> Dict:
+    """Resultado de um email no fim do prazo: tempo_esgotado se não terminou, erro se a tarefa falhou."""
+    if not task.done() or task.cancelled():
+        return _timed_out_result(it)
+    if task.exception() is not None:
+        return _build_result(it, task.exception(), "")
+    return task.result()[1]
+
+
+def set_request_deadline(segundos: Optional[float] = None) -> None:
+    """Define o prazo da requisição atual; None usa REQUEST_DEADLINE_SECONDS e 0 desativa o prazo."""
+    if segundos is None:
+        segundos = REQUEST_DEADLINE_SECONDS
+    segundos = min(segundos, REQUEST_DEADLINE_MAX_SECONDS)
+    request_deadline.set(time.monotonic() + segundos if segundos > 0 else None)
+
+
+def _remaining() -> Optional[float]:
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+async def _resolved(result: Dict) -> Dict:
+    return result
+
+
+async def _copy_of(rep: "asyncio.Future[Tuple[int, Dict]]", it: Dict[str, str], rep_arquivo: str) -> Dict:
+    _, result = await asyncio.shield(rep)
+    dup = copy.deepcopy(result)
+    dup["arquivo"] = it.get("arquivo", "texto")
+    dup["duplicado_de"] = rep_arquivo
+    dup.pop("extracao", None)
+    if it.get("extracao"):
+        dup["extracao"] = it["extracao"]
+    return dup
+
+
+class _Router:
+    """Por requisição: resolve vazios localmente e aponta duplicatas (exatas ou quase) para um representante."""
+
+    def __init__(self) -> None:
+        self.index = DuplicateIndex() if DEDUP_ENABLED else None
+
+    def route(self, idx: int, it: Dict[str, str]) -> Tuple[str, Optional[int]]:
+        texto = trim_email(it["texto"])
+        if is_near_empty(texto):
+            return "vazio", None
+        if self.index is not None:
+            rep = self.index.find_or_add(idx, texto, simple_tokens(texto))
+            if rep is not None:
+                LLM_SKIPPED.inc(motivo="duplicado")
+                return "duplicado", rep
+        return "novo", None
+
+
+def _partial_for(on_partial: Optional[Callable[[int, Dict[str, Any]], None]], idx: int) -> Optional[PartialCallback]:
+    if on_partial is None:
+        return None
+    return lambda evento: on_partial(idx, evento)
+
+
+def _plan_jobs(
+    items: List[Dict[str, str]],
+    on_partial: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+) -> Tuple[List[Awaitable[Tuple[int, Dict]]], List[asyncio.Future]]:
+    router = _Router()
+    routes = [router.route(i, it) for i, it in enumerate(items)]
+    reps = [i for i, (kind, _) in enumerate(routes) if kind == "novo"]
+
+    owned: List[asyncio.Future] = []
+    rep_jobs: Dict[int, asyncio.Future] = {}
+    if BATCH_CLASSIFICATION and _llm_enabled() and len(reps) > 1:
+        for chunk in plan_batches([items[i]["texto"] for i in reps]):
+            batch = asyncio.ensure_future(classify_batch([items[reps[c]]["texto"] for c in chunk]))
+            owned.append(batch)
+            for pos, c in enumerate(chunk):
+                i = reps[c]
+                rep_jobs[i] = asyncio.ensure_future(
+                    _indexed(i, process_one(items[i], _pick(batch, pos), _partial_for(on_partial, i)))
+                )
+    else:
+        for i in reps:
+            rep_jobs[i] = asyncio.ensure_future(_indexed(i, process_one(items[i], on_partial=_partial_for(on_partial, i))))
+    owned.extend(rep_jobs.values())
+
+    jobs: List[Awaitable[Tuple[int, Dict]]] = []
+    for i, (kind, rep) in enumerate(routes):
+        if kind == "novo":
+            jobs.append(rep_jobs[i])
+        elif kind == "vazio":
+            jobs.append(_indexed(i, _resolved(_empty_result(items[i]))))
+        else:
+            jobs.append(_indexed(i, _copy_of(rep_jobs[rep], items[i], items[rep].get("arquivo", "texto"))))
+    return jobs, owned
+
+
+async def process_texts(items: List[Dict[str, str]]) -> List[Dict]:
+    """Processa todos os emails; os que não terminam dentro do prazo da requisição voltam como tempo_esgotado."""
+    jobs, owned = _plan_jobs(items)
+    tasks = [asyncio.ensure_future(job) for job in jobs]
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=_remaining()) if tasks else (set(), set())
+        if pending:
+            REQUESTS_ABORTED.inc(motivo="prazo")
+        return [_settled_result(t, items[i]) for i, t in enumerate(tasks)]
+    finally:
+        for t in tasks + owned:
+            if not t.done():
+                t.cancel()
+
+
+async def stream_texts(
+    items: List[Dict[str, str]],
+    on_partial: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+) -> AsyncIterator[Tuple[int, Dict]]:
+    """Gera (índice, resultado) na ordem em que cada email termina; `on_partial(índice, evento)` antecipa cada etapa."""
+    jobs, owned = _plan_jobs(items, on_partial)
+    tasks = [asyncio.ensure_future(_guarded(i, job, items[i])) for i, job in enumerate(jobs)]
+    entregues = set()
+    try:
+        try:
+            for fut in asyncio.as_completed(tasks, timeout=_remaining()):
+                idx, result = await fut
+                entregues.add(idx)
+                yield idx, result
+        except asyncio.TimeoutError:
+            expirou = True
+        else:
+            expirou = False
+        if expirou:
+            REQUESTS_ABORTED.inc(motivo="prazo")
+            for i, t in enumerate(tasks):
+                if i not in entregues:
+                    yield i, _settled_result(t, items[i])
+    finally:
+        for t in tasks + owned:
+            if not t.done():
+                t.cancel()
+
+
+def _unread_timed_out(esperados: Optional[List[str]], lidos: int) -> List[Tuple[int, Dict]]:
+    """Resultados tempo_esgotado para os itens que a fonte nem chegou a entregar (ex.: uploads ainda não lidos)."""
+    return [(i, _timed_out_result({"arquivo": nome})) for i, nome in enumerate(esperados or []) if i >= lidos]
+
+
+async def stream_items(
+    source: AsyncIterator[Dict[str, str]],
+    on_partial: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+    esperados: Optional[List[str]] = None,
+) -> AsyncIterator[Tuple[int, Dict]]:
+    """Como stream_texts, mas inicia cada email assim que a fonte o entrega (extração e LLM em paralelo).
+
+    `esperados` traz, na ordem da fonte, o nome de cada item; se o prazo esgotar, os ainda não lidos
+    também voltam como tempo_esgotado.
+    """
+    if BATCH_CLASSIFICATION and _llm_enabled():
+        items: List[Dict[str, str]] = []
+
+        async def collect() -> None:
+            async for it in source:
+                items.append(it)
+
+        coletor = asyncio.ensure_future(collect())
+        try:
+            await asyncio.wait({coletor}, timeout=_remaining())
+        finally:
+            coletor.cancel()
+        if coletor.done() and not coletor.cancelled():
+            coletor.result()
+        elif not items:
+            # Com itens lidos, stream_texts também encontra o prazo esgotado e faz a contagem.
+            REQUESTS_ABORTED.inc(motivo="prazo")
+        async for pair in stream_texts(items, on_partial):
+            yield pair
+        for pair in _unread_timed_out(esperados, len(items)):
+            yield pair
+        return
+
+    finished: "asyncio.Queue[asyncio.Task]" = asyncio.Queue()
+    tasks: List[asyncio.Task] = []
+    router = _Router()
+    itens: List[Dict[str, str]] = []
+
+    async def feed() -> None:
+        async for it in source:
+            idx = len(tasks)
+            itens.append(it)
+            kind, rep = router.route(idx, it)
+            if kind == "vazio":
+                job = _resolved(_empty_result(it))
+            elif kind == "duplicado":
+                job = _copy_of(tasks[rep], it, itens[rep].get("arquivo", "texto"))
+            else:
+                job = process_one(it, on_partial=_partial_for(on_partial, idx))
+            task = asyncio.ensure_future(_guarded(idx, _indexed(idx, job), it))
+            task.add_done_callback(finished.put_nowait)
+            tasks.append(task)
+
+    feeder = asyncio.ensure_future(feed())
+    entregues = set()
+    try:
+        while True:
+            restante = _remaining()
+            if restante == 0:
+                # Prazo esgotado: emails iniciados e itens ainda não lidos voltam como tempo_esgotado.
+                REQUESTS_ABORTED.inc(motivo="prazo")
+                feeder.cancel()
+                for i, t in enumerate(tasks):
+                    if i not in entregues:
+                        yield i, _settled_result(t, itens[i])
+                for pair in _unread_timed_out(esperados, len(tasks)):
+                    yield pair
+                break
+            getter = asyncio.ensure_future(finished.get())
+            aguardando = {getter}
+            if feeder.done():
+                feeder.result()
+                if len(entregues) == len(tasks):
+                    getter.cancel()
+                    break
+            else:
+                aguardando.add(feeder)
+            await asyncio.wait(aguardando, timeout=restante, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                continue
+            idx, result = getter.result().result()
+            entregues.add(idx)
+            yield idx, result
+    finally:
+        feeder.cancel()
+        for t in tasks:
+            if not t.done():
+                t.cancel()
@@ -1,18 +1,96 @@
+import os
+import math
+import time
 import asyncio
-from typing import Dict, List
-from .ai_service import classify_one
+from typing import Dict, List, Optional
+from .ai_service import classify_and_draft, classify_one, generate_one
+from .cache import cache_bypass
+from .llm_backend import call_meter
 from .prompts import get_validation_set
 
+VALIDATION_CONCURRENCY = int(os.getenv("VALIDATION_CONCURRENCY", "8"))
+# Preço por milhão de tokens (USD); padrão: llama-3.1-8b-instant na Groq.
+LLM_PRICE_INPUT_PER_MTOK = float(os.getenv("LLM_PRICE_INPUT_PER_MTOK", "0.05"))
+LLM_PRICE_OUTPUT_PER_MTOK = float(os.getenv("LLM_PRICE_OUTPUT_PER_MTOK", "0.08"))
 
-async def validate_model() -> Dict:
-    validation_set = get_validation_set()
+# classificacao: só classify_one; dois_passos: classificação e depois a resposta;
+# combinado: classify_and_draft, gerando a resposta à parte só quando ela não vier.
+FLUXOS = ("classificacao", "dois_passos", "combinado")
+
+
+def _percentil(amostras: List[float], p: float) -> float:
+    if not amostras:
+        return 0.0
+    ordenadas = sorted(amostras)
+    return ordenadas[min(len(ordenadas) - 1, max(0, math.ceil(p / 100.0 * len(ordenadas)) - 1))]
+
+
+async def _run_flow(texto: str, fluxo: str) -> Dict:
+    if fluxo == "classificacao":
+        return await classify_one(texto)
+    classification = await (classify_and_draft(texto) if fluxo == "combinado" else classify_one(texto))
+    if not classification.pop("resposta", None) and classification.get("status", "ok") == "ok":
+        await generate_one(texto, classification.get("categoria", "IMPRODUTIVO"))
+    return classification
+
+
+async def _classify_measured(texto: str, vagas: asyncio.Semaphore, reproducao: bool, fluxo: str) -> Dict:
+    async with vagas:
+        meter: Dict[str, float] = {}
+        call_meter.set(meter)
+        started = time.perf_counter()
+        classification = await _run_flow(texto, fluxo)
+        latencia = time.perf_counter() - started
+    if reproducao:
+        latencia = meter.get("latencia_gravada_s", 0.0)
+    return {
+        "classificacao": classification,
+        "latencia_s": round(latencia, 4),
+        "tokens_entrada": int(meter.get("tokens_entrada", 0)),
+        "tokens_saida": int(meter.get("tokens_saida", 0)),
+        "chamadas": int(meter.get("chamadas", 0)),
+    }
+
+
+async def validate_model(
+    validation_set: Optional[List[Dict[str, str]]] = None,
+    concorrencia: int = VALIDATION_CONCURRENCY,
+    reproducao: bool = False,
+    fluxo: str = "classificacao",
+) -> Dict:
+    if validation_set is None:
+        validation_set = get_validation_set()
+
+    # Mede o modelo, não o cache de resultados.
+    cache_bypass.set(True)
+    vagas = asyncio.Semaphore(max(1, concorrencia))
+    started = time.perf_counter()
+    medidos = await asyncio.gather(
+        *(_classify_measured(it["email"], vagas, reproducao, fluxo) for it in validation_set)
+    )
+    duracao = time.perf_counter() - started
 
     results = []
     correct = 0
-    total = len(validation_set)
+    erros = 0
+
+    for item, medido in zip(validation_set, medidos):
+        classification = medido["classificacao"]
+        custos = {k: medido[k] for k in ("latencia_s", "tokens_entrada", "tokens_saida", "chamadas")}
 
-    for item in validation_set:
-        classification = await classify_one(item["email"])
+        if classification.get("status", "ok") != "ok":
+            erros += 1
+            results.append({
+                "email": item["email"][:50] + "...",
+                "esperado": item["categoria_esperada"],
+                "predito": None,
+                "confianca": 0,
+                "correto": False,
+                "erro": True,
+                "razao_modelo": classification.get("razao", ""),
+                **custos
+            })
+            continue
 
         categoria_predita = classification.get("categoria", "IMPRODUTIVO")
         categoria_esperada = item["categoria_esperada"]
@@ -27,24 +105,35 @@ async def validate_model() -> Dict:
             "predito": categoria_predita,
             "confianca": classification.get("confianca", 0),
             "correto": is_correct,
-            "razao_modelo": classification.get("razao", "")
+            "razao_modelo": classification.get("razao", ""),
+            **custos
         })
 
+    scored = [r for r in results if not r.get("erro")]
+    total = len(scored)
     accuracy = (correct / total) * 100 if total > 0 else 0
 
-    tp = sum(1 for r in results if r["esperado"] == "PRODUTIVO" and r["correto"])
-    fp = sum(1 for r in results if r["esperado"] == "IMPRODUTIVO" and not r["correto"])
-    tn = sum(1 for r in results if r["esperado"] == "IMPRODUTIVO" and r["correto"])
-    fn = sum(1 for r in results if r["esperado"] == "PRODUTIVO" and not r["correto"])
+    tp = sum(1 for r in scored if r["esperado"] == "PRODUTIVO" and r["correto"])
+    fp = sum(1 for r in scored if r["esperado"] == "IMPRODUTIVO" and not r["correto"])
+    tn = sum(1 for r in scored if r["esperado"] == "IMPRODUTIVO" and r["correto"])
+    fn = sum(1 for r in scored if r["esperado"] == "PRODUTIVO" and not r["correto"])
 
     precision = (tp / (tp + fp)) * 100 if (tp + fp) > 0 else 0
     recall = (tp / (tp + fn)) * 100 if (tp + fn) > 0 else 0
     f1_score = (2 * precision * recall / (precision + recall)) if (precision + recall) > 0 else 0
 
+    latencias = [r["latencia_s"] for r in results]
+    tokens_entrada = sum(r["tokens_entrada"] for r in results)
+    tokens_saida = sum(r["tokens_saida"] for r in results)
+    custo = (tokens_entrada * LLM_PRICE_INPUT_PER_MTOK + tokens_saida * LLM_PRICE_OUTPUT_PER_MTOK) / 1e6
+    n = max(len(results), 1)
+
     return {
+        "fluxo": fluxo,
         "total_exemplos": total,
         "corretos": correct,
         "incorretos": total - correct,
+        "erros_llm": erros,
         "acuracia": round(accuracy, 2),
         "precisao": round(precision, 2),
         "recall": round(recall, 2),
@@ -55,22 +144,42 @@ async def validate_model() -> Dict:
             "verdadeiros_negativos": tn,
             "falsos_negativos": fn
         },
+        "desempenho": {
+            "latencia_p50_s": round(_percentil(latencias, 50), 4),
+            "latencia_p95_s": round(_percentil(latencias, 95), 4),
+            "duracao_total_s": round(duracao, 3),
+            "tokens_entrada": tokens_entrada,
+            "tokens_saida": tokens_saida,
+            "tokens_entrada_por_email": round(tokens_entrada / n, 1),
+            "chamadas_por_email": round(sum(r["chamadas"] for r in results) / n, 2),
+            "custo_estimado_usd": round(custo, 6),
+            "custo_por_1000_emails_usd": round(custo / n * 1000, 4),
+        },
         "resultados_detalhados": results
     }
 
 
-async def run_validation_report():
+DETALHES_MAX = 20
+
+
+async def run_validation_report(
+    validation_set: Optional[List[Dict[str, str]]] = None,
+    concorrencia: int = VALIDATION_CONCURRENCY,
+    reproducao: bool = False,
+    fluxo: str = "classificacao",
+):
     print("=" * 60)
     print("VALIDAÇÃO DO MODELO DE CLASSIFICAÇÃO DE EMAILS")
     print("=" * 60)
     print("\nExecutando testes com conjunto de validação...\n")
 
-    metrics = await validate_model()
+    metrics = await validate_model(validation_set, concorrencia, reproducao, fluxo)
 
     print(f"📊 MÉTRICAS DE PERFORMANCE:")
     print(f"   Total de exemplos testados: {metrics['total_exemplos']}")
     print(f"   Classificações corretas: {metrics['corretos']}")
     print(f"   Classificações incorretas: {metrics['incorretos']}")
+    print(f"   Falhas de chamada ao LLM (excluídas): {metrics['erros_llm']}")
     print(f"   Acurácia: {metrics['acuracia']}%")
     print(f"   Precisão: {metrics['precisao']}%")
     print(f"   Recall: {metrics['recall']}%")
@@ -83,12 +192,29 @@ async def run_validation_report():
     print(f"   Verdadeiros Negativos (TN): {cm['verdadeiros_negativos']}")
     print(f"   Falsos Negativos (FN): {cm['falsos_negativos']}")
 
-    print(f"\n🔍 RESULTADOS DETALHADOS:")
-    for i, result in enumerate(metrics['resultados_detalhados'], 1):
+    d = metrics['desempenho']
+    print(f"\n⏱️  LATÊNCIA E CUSTO{' (latências gravadas)' if reproducao else ''}:")
+    print(f"   Latência p50: {d['latencia_p50_s'] * 1000:.0f} ms | p95: {d['latencia_p95_s'] * 1000:.0f} ms")
+    print(f"   Duração total: {d['duracao_total_s']}s (concorrência {concorrencia})")
+    print(f"   Fluxo: {fluxo} ({d['chamadas_por_email']} chamadas por email)")
+    print(f"   Tokens: {d['tokens_entrada']} entrada / {d['tokens_saida']} saída")
+    print(f"   Custo estimado: US$ {d['custo_estimado_usd']:.4f} (US$ {d['custo_por_1000_emails_usd']:.4f} por 1000 emails)")
+
+    detalhados = list(enumerate(metrics['resultados_detalhados'], 1))
+    if len(detalhados) > DETALHES_MAX:
+        # Em datasets grandes, só os casos que pedem atenção.
+        detalhados = [(i, r) for i, r in detalhados if not r['correto']][:DETALHES_MAX]
+        print(f"\n🔍 RESULTADOS DETALHADOS (primeiros {len(detalhados)} erros):")
+    else:
+        print(f"\n🔍 RESULTADOS DETALHADOS:")
+    for i, result in detalhados:
         status = "✓" if result['correto'] else "✗"
         print(f"\n   {status} Teste {i}:")
         print(f"      Email: {result['email']}")
         print(f"      Esperado: {result['esperado']}")
+        if result.get('erro'):
+            print(f"      ⚠️  FALHA NO LLM: {result['razao_modelo']}")
+            continue
         print(f"      Predito: {result['predito']} (confiança: {result['confianca']}%)")
         if not result['correto']:
             print(f"      ⚠️  ERRO - Necessita ajuste no prompt")
@@ -111,5 +237,83 @@ async def run_validation_report():
 
     return metrics
 
+async def run_comparison_report(
+    validation_set: Optional[List[Dict[str, str]]] = None,
+    concorrencia: int = VALIDATION_CONCURRENCY,
+    reproducao: bool = False,
+) -> Dict[str, Dict]:
+    """Compara o fluxo atual (duas chamadas) com o prompt combinado no mesmo conjunto."""
+    comparacao = {}
+    for fluxo in ("dois_passos", "combinado"):
+        comparacao[fluxo] = await validate_model(validation_set, concorrencia, reproducao, fluxo)
+
+    linhas = [
+        ("Acurácia (%)", lambda m: m["acuracia"]),
+        ("F1-Score (%)", lambda m: m["f1_score"]),
+        ("Falhas do LLM", lambda m: m["erros_llm"]),
+        ("Latência p50 (ms)", lambda m: round(m["desempenho"]["latencia_p50_s"] * 1000)),
+        ("Latência p95 (ms)", lambda m: round(m["desempenho"]["latencia_p95_s"] * 1000)),
+        ("Chamadas por email", lambda m: m["desempenho"]["chamadas_por_email"]),
+        ("Tokens de entrada por email", lambda m: m["desempenho"]["tokens_entrada_por_email"]),
+        ("Custo por 1000 emails (US$)", lambda m: m["desempenho"]["custo_por_1000_emails_usd"]),
+    ]
+    print("=" * 60)
+    print("COMPARAÇÃO: DUAS CHAMADAS x PROMPT COMBINADO")
+    print("=" * 60)
+    print(f"   {'':30}{'dois_passos':>14}{'combinado':>14}")
+    for rotulo, valor in linhas:
+        print(f"   {rotulo:30}{valor(comparacao['dois_passos']):>14}{valor(comparacao['combinado']):>14}")
+    if reproducao:
+        print("\n   (latências gravadas)")
+    print("\n   Ative o modo combinado com COMBINED_PROMPT=true.")
+    return comparacao
+
+
+def _main() -> None:
+    import json
+    import argparse
+    from .local_classifier import load_labeled
+    from .llm_backend import RecordingBackend, ReplayBackend, get_backend, set_backend
+
+    parser = argparse.ArgumentParser(description="Valida a classificação em um conjunto rotulado (JSONL/CSV)")
+    parser.add_argument("--data", help="JSONL/CSV com email/texto e categoria/categoria_esperada; padrão: VALIDATION_SET")
+    parser.add_argument("--limite", type=int, default=None, help="usa só os primeiros N exemplos")
+    parser.add_argument("--concorrencia", type=int, default=VALIDATION_CONCURRENCY)
+    parser.add_argument("--fluxo", choices=FLUXOS, default="classificacao",
+                        help="mede só a classificação, o fluxo de duas chamadas ou o prompt combinado")
+    parser.add_argument("--comparar", action="store_true", help="compara dois_passos e combinado no mesmo conjunto")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--gravar", metavar="ARQUIVO", help="grava as respostas do LLM para reprodução")
+    modo.add_argument("--reproduzir", metavar="ARQUIVO", help="usa respostas gravadas, sem chamar o LLM")
+    parser.add_argument("--json", metavar="ARQUIVO", help="grava as métricas completas em JSON")
+    args = parser.parse_args()
+
+    items = load_labeled(args.data) if args.data else list(get_validation_set())
+    if args.limite:
+        items = items[:args.limite]
+
+    gravador = None
+    if args.gravar:
+        gravador = RecordingBackend(get_backend(), args.gravar)
+        set_backend(gravador)
+    elif args.reproduzir:
+        set_backend(ReplayBackend(args.reproduzir))
+
+    try:
+        if args.comparar:
+            metrics = asyncio.run(run_comparison_report(items, args.concorrencia, reproducao=bool(args.reproduzir)))
+        else:
+            metrics = asyncio.run(
+                run_validation_report(items, args.concorrencia, reproducao=bool(args.reproduzir), fluxo=args.fluxo)
+            )
+    finally:
+        if gravador is not None:
+            gravador.close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+
+
 if __name__ == "__main__":
-    asyncio.run(run_validation_report())
\ No newline at end of file
+    _main()
\ No newline at end of file
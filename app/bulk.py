@@ -0,0 +1,300 @@
+import os
+import io
+import csv
+import sys
+import json
+import time
+import asyncio
+import mailbox
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from .ai_service import LLM_TOKENS, USE_NLP_PREPROCESSING, process_texts
+from .file_processor import SUPPORTED_EXTENSIONS, extract_bytes, extract_saved
+from .http_client import close_client
+from .scheduler import request_key
+from .workers import stop_workers
+
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "16"))
+
+CSV_FIELDS = ("id", "arquivo", "status", "categoria", "confianca", "razao", "resposta", "duplicado_de")
+# Resultados com estes status são transitórios (LLM fora do ar, limite de taxa, prazo) e voltam à fila ao retomar.
+RETRY_STATUSES = ("erro", "tempo_esgotado")
+
+# (id estável entre execuções, nome para o extrator, caminho em disco ou bytes da mensagem)
+Source = Tuple[str, str, Any]
+
+
+def iter_mbox(path: str) -> Iterator[Source]:
+    box = mailbox.mbox(path, create=False)
+    base = os.path.basename(path)
+    try:
+        for key in box.iterkeys():
+            yield f"{base}#{key}", f"{base}#{key}.eml", box.get_bytes(key)
+    finally:
+        box.close()
+
+
+def iter_directory(path: str) -> Iterator[Source]:
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for nome in sorted(files):
+            if nome.lower().endswith(SUPPORTED_EXTENSIONS):
+                caminho = os.path.join(root, nome)
+                yield os.path.relpath(caminho, path), nome, caminho
+
+
+def iter_sources(path: str) -> Iterator[Source]:
+    if os.path.isdir(path):
+        return iter_directory(path)
+    return iter_mbox(path)
+
+
+class Checkpoint:
+    """Registra, após cada resultado gravado, o tamanho do arquivo de saída, o id e o status.
+
+    Ao retomar, a saída é truncada no último registro confirmado, descartando uma linha escrita pela metade.
+    """
+
+    def __init__(self, saida: str):
+        self.path = saida + ".checkpoint"
+        self.done: Set[str] = set()
+        self.status: Dict[str, str] = {}
+        self.offset = 0
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                offset, sep, resto = line.rstrip("\n").partition("\t")
+                if not sep or not offset.isdigit() or not line.endswith("\n"):
+                    continue
+                # Checkpoints antigos não têm a coluna de status.
+                ident, _, status = resto.partition("\t")
+                self.done.add(ident)
+                self.status[ident] = status or "ok"
+                self.offset = max(self.offset, int(offset))
+
+    def retryable(self) -> Set[str]:
+        return {ident for ident, status in self.status.items() if status in RETRY_STATUSES}
+
+    def open(self) -> None:
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def mark(self, ident: str, offset: int, status: str = "ok") -> None:
+        self.done.add(ident)
+        self.status[ident] = status
+        self.offset = offset
+        self._fh.write(f"{offset}\t{ident}\t{status}\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class ResultWriter:
+    def __init__(self, saida: str, offset: int):
+        self.csv = saida.lower().endswith(".csv")
+        novo = not os.path.exists(saida) or offset == 0
+        self._fh = open(saida, "r+b" if not novo else "wb")
+        self._fh.seek(offset)
+        self._fh.truncate()
+        if novo and self.csv:
+            self._write_text(self._csv_line(dict(zip(CSV_FIELDS, CSV_FIELDS))))
+
+    @staticmethod
+    def _csv_line(row: Dict[str, Any]) -> str:
+        buf = io.StringIO()
+        csv.DictWriter(buf, fieldnames=CSV_FIELDS, extrasaction="ignore").writerow(row)
+        return buf.getvalue()
+
+    def _write_text(self, text: str) -> int:
+        self._fh.write(text.encode("utf-8"))
+        self._fh.flush()
+        return self._fh.tell()
+
+    def write(self, ident: str, resultado: Dict[str, Any]) -> int:
+        if not self.csv:
+            return self._write_text(json.dumps({"id": ident, **resultado}, ensure_ascii=False) + "\n")
+        cls = resultado["classificacao"]
+        return self._write_text(self._csv_line({
+            "id": ident,
+            "arquivo": resultado["arquivo"],
+            "status": resultado.get("status", "ok"),
+            "categoria": cls["categoria"],
+            "confianca": cls["confianca"],
+            "razao": cls["razao"],
+            "resposta": resultado["resposta"],
+            "duplicado_de": resultado.get("duplicado_de") or "",
+        }))
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def _drop_results(saida: str, checkpoint: Checkpoint, descartar: Set[str]) -> None:
+    """Reescreve a saída e o checkpoint sem os resultados de `descartar`, que serão processados de novo."""
+    with open(saida, "rb") as f:
+        confirmado = f.read(checkpoint.offset).decode("utf-8")
+    if saida.lower().endswith(".csv"):
+        linhas = [
+            (row["id"], row.get("status") or "ok", ResultWriter._csv_line(row))
+            for row in csv.DictReader(io.StringIO(confirmado, newline=""))
+        ]
+    else:
+        linhas = []
+        for line in confirmado.splitlines(keepends=True):
+            registro = json.loads(line)
+            linhas.append((registro["id"], registro.get("status", "ok"), line))
+
+    raiz, ext = os.path.splitext(saida)
+    temporario = f"{raiz}.tmp{ext}"
+    writer = ResultWriter(temporario, 0)
+    try:
+        with open(checkpoint.path + ".tmp", "w", encoding="utf-8") as ck:
+            for ident, status, line in linhas:
+                if ident not in descartar:
+                    ck.write(f"{writer._write_text(line)}\t{ident}\t{status}\n")
+    finally:
+        writer.close()
+    os.replace(temporario, saida)
+    os.replace(checkpoint.path + ".tmp", checkpoint.path)
+
+
+class Progress:
+    def __init__(self, intervalo: float, stream=sys.stderr):
+        self.intervalo = intervalo
+        self.stream = stream
+        self.processados = 0
+        self.erros = 0
+        self.started = time.perf_counter()
+        self._last = self.started
+        self._tokens_inicio = self._tokens()
+
+    @staticmethod
+    def _tokens() -> float:
+        return LLM_TOKENS.value(tipo="prompt") + LLM_TOKENS.value(tipo="completion")
+
+    def add(self, resultado: Dict[str, Any]) -> None:
+        self.processados += 1
+        if resultado.get("status", "ok") != "ok":
+            self.erros += 1
+        agora = time.perf_counter()
+        if agora - self._last >= self.intervalo:
+            self._last = agora
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        tokens = self._tokens() - self._tokens_inicio
+        prefixo = "Concluído" if final else "Progresso"
+        print(
+            f"{prefixo}: {self.processados} emails em {elapsed:.1f}s | "
+            f"{self.processados / elapsed:.2f} emails/s | {tokens / elapsed:.1f} tokens/s | "
+            f"{self.erros} não-ok",
+            file=self.stream,
+            flush=True,
+        )
+
+
+async def _extract(nome: str, origem: Any) -> Dict[str, Any]:
+    if isinstance(origem, str):
+        return await extract_saved(origem, nome)
+    return await extract_bytes(origem, nome)
+
+
+async def run_bulk(
+    entrada: str,
+    saida: str,
+    concorrencia: int = BULK_CONCURRENCY,
+    intervalo: float = 5.0,
+    recomecar: bool = False,
+) -> Progress:
+    checkpoint = Checkpoint(saida)
+    if recomecar and os.path.exists(checkpoint.path):
+        os.unlink(checkpoint.path)
+    checkpoint.load()
+    repetir = checkpoint.retryable()
+    if repetir:
+        print(f"Repetindo {len(repetir)} emails que terminaram com erro ou tempo esgotado.", file=sys.stderr)
+        _drop_results(saida, checkpoint, repetir)
+        checkpoint = Checkpoint(saida)
+        checkpoint.load()
+    writer = ResultWriter(saida, checkpoint.offset)
+    checkpoint.open()
+    progress = Progress(intervalo)
+    if checkpoint.done:
+        print(f"Retomando: {len(checkpoint.done)} emails já processados.", file=sys.stderr)
+
+    request_key.set("bulk")
+    vagas = asyncio.Semaphore(max(1, concorrencia))
+    pendentes: Set[asyncio.Task] = set()
+    falha: Optional[BaseException] = None
+
+    async def handle(ident: str, nome: str, origem: Any) -> None:
+        try:
+            doc = await _extract(nome, origem)
+            item = {"arquivo": nome, "texto": doc.pop("texto"), "extracao": doc}
+            resultado = (await process_texts([item]))[0]
+            checkpoint.mark(ident, writer.write(ident, resultado), resultado.get("status", "ok"))
+            progress.add(resultado)
+        finally:
+            vagas.release()
+
+    def on_done(task: asyncio.Task) -> None:
+        nonlocal falha
+        pendentes.discard(task)
+        if not task.cancelled() and task.exception() is not None and falha is None:
+            falha = task.exception()
+
+    try:
+        for ident, nome, origem in iter_sources(entrada):
+            if falha is not None:
+                raise falha
+            if ident in checkpoint.done:
+                continue
+            await vagas.acquire()
+            task = asyncio.ensure_future(handle(ident, nome, origem))
+            pendentes.add(task)
+            task.add_done_callback(on_done)
+        if pendentes:
+            await asyncio.gather(*list(pendentes))
+    finally:
+        for t in list(pendentes):
+            t.cancel()
+        writer.close()
+        checkpoint.close()
+        await close_client()
+        stop_workers()
+    progress.report(final=True)
+    return progress
+
+
+def _main() -> None:
+    import argparse
+    from .nlp_processor import ensure_resources
+    from .local_classifier import load_model
+
+    parser = argparse.ArgumentParser(description="Classifica em lote um arquivo mbox ou um diretório de emails (.eml/.msg/.txt/.pdf)")
+    parser.add_argument("entrada", help="arquivo mbox ou diretório")
+    parser.add_argument("--saida", default="resultados.jsonl", help="arquivo .jsonl ou .csv")
+    parser.add_argument("--concorrencia", type=int, default=BULK_CONCURRENCY, help="emails em andamento ao mesmo tempo")
+    parser.add_argument("--intervalo", type=float, default=5.0, help="segundos entre relatórios de progresso")
+    parser.add_argument("--recomecar", action="store_true", help="ignora o checkpoint e sobrescreve a saída")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.entrada):
+        raise SystemExit(f"Entrada não encontrada: {args.entrada}")
+    if USE_NLP_PREPROCESSING:
+        ensure_resources()
+        load_model()
+
+    try:
+        asyncio.run(run_bulk(args.entrada, args.saida, args.concorrencia, args.intervalo, args.recomecar))
+    except KeyboardInterrupt:
+        print("Interrompido; execute de novo para continuar do checkpoint.", file=sys.stderr)
+        raise SystemExit(130)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import contextvars
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .metrics import Counter
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")
+
+CACHE_REQUESTS = Counter("llm_cache_requests_total", "Consultas ao cache de resultados do LLM")
+
+cache_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+def cache_key(tipo: str, texto_normalizado: str, **params: Any) -> str:
+    payload = json.dumps(
+        {"tipo": tipo, "texto": texto_normalizado, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _SqliteTier:
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (chave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT valor, expira FROM llm_cache WHERE chave = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._conn.execute("DELETE FROM llm_cache WHERE chave = ?", (key,))
+                self._conn.commit()
+                return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        valor = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (chave, valor, expira) VALUES (?, ?, ?)",
+                (key, valor, time.time() + ttl),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class ResultCache:
+    """Cache LRU com TTL em memória, camada SQLite opcional e coalescência de chamadas idênticas."""
+
+    def __init__(self, max_entries: int, ttl: float, db_path: str = "", enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._disk = _SqliteTier(db_path) if db_path else None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def _memory_get(self, key: str) -> Optional[Any]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expira, value = entry
+        if expira < time.monotonic():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: Any) -> None:
+        self._memory[key] = (time.monotonic() + self.ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str, tipo: str = "") -> Optional[Any]:
+        value = self._memory_get(key)
+        if value is not None:
+            CACHE_REQUESTS.inc(tipo=tipo, resultado="hit_memoria")
+            return value
+        if self._disk is not None:
+            value = await asyncio.to_thread(self._disk.get, key)
+            if value is not None:
+                self._memory_set(key, value)
+                CACHE_REQUESTS.inc(tipo=tipo, resultado="hit_disco")
+                return value
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        self._memory_set(key, value)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.set, key, value, self.ttl)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        tipo: str = "",
+        should_store: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        if not self.enabled or cache_bypass.get():
+            CACHE_REQUESTS.inc(tipo=tipo, resultado="bypass")
+            return await factory()
+
+        value = await self.get(key, tipo)
+        if value is not None:
+            return value
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            CACHE_REQUESTS.inc(tipo=tipo, resultado="coalescido")
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                return await self.get_or_compute(key, factory, tipo, should_store)
+
+        CACHE_REQUESTS.inc(tipo=tipo, resultado="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            if should_store(value):
+                await self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+
+RESULT_CACHE = ResultCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL, LLM_CACHE_DB, LLM_CACHE_ENABLED)
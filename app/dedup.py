@@ -0,0 +1,83 @@
+import os
+import re
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+MIN_TEXT_CHARS = int(os.getenv("MIN_TEXT_CHARS", "3"))
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))
+NEAR_DUP_MIN_TOKENS = int(os.getenv("NEAR_DUP_MIN_TOKENS", "20"))
+
+SIMHASH_BITS = 64
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def is_near_empty(texto: str) -> bool:
+    return len(_WORD_RE.findall(texto or "")) == 0 or sum(c.isalnum() for c in texto) < MIN_TEXT_CHARS
+
+
+def exact_key(texto: str) -> str:
+    return hashlib.sha256(" ".join(texto.lower().split()).encode("utf-8")).hexdigest()
+
+
+def simple_tokens(texto: str) -> List[str]:
+    return _WORD_RE.findall(texto.lower())
+
+
+def simhash(tokens: Sequence[str], shingle: int = 3) -> int:
+    if len(tokens) >= shingle:
+        features = [" ".join(tokens[i:i + shingle]) for i in range(len(tokens) - shingle + 1)]
+    else:
+        features = list(tokens)
+    if not features:
+        return 0
+    digests = b"".join(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest() for f in features)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(features), 8), axis=1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(features)
+    return int.from_bytes(np.packbits(votes > 0).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class DuplicateIndex:
+    """Índice por requisição: devolve o representante de um texto igual ou quase igual já visto."""
+
+    def __init__(self, max_distance: int = SIMHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        # Com max_distance + 1 faixas, dois hashes a essa distância sempre coincidem em alguma faixa.
+        self._bands_n = max_distance + 1
+        self._band_bits = SIMHASH_BITS // self._bands_n
+        self._exact: Dict[str, int] = {}
+        self._hashes: Dict[int, int] = {}
+        self._bands: Dict[tuple, List[int]] = defaultdict(list)
+
+    def _band_keys(self, h: int):
+        mask = (1 << self._band_bits) - 1
+        return [(b, (h >> (b * self._band_bits)) & mask) for b in range(self._bands_n)]
+
+    def find_or_add(self, ident: int, texto: str, tokens: Sequence[str]) -> Optional[int]:
+        key = exact_key(texto)
+        if key in self._exact:
+            return self._exact[key]
+        self._exact[key] = ident
+
+        if len(tokens) < NEAR_DUP_MIN_TOKENS:
+            return None
+
+        h = simhash(tokens)
+        for band in self._band_keys(h):
+            for other in self._bands[band]:
+                if hamming(h, self._hashes[other]) <= self.max_distance:
+                    self._exact[key] = other
+                    return other
+
+        self._hashes[ident] = h
+        for band in self._band_keys(h):
+            self._bands[band].append(ident)
+        return None
@@ -0,0 +1,104 @@
+import os
+import re
+
+EMAIL_TRIM_ENABLED = os.getenv("EMAIL_TRIM_ENABLED", "true").lower() == "true"
+# Uma despedida só corta o texto se o que vem depois couber numa assinatura.
+SIGNATURE_MAX_LINES = int(os.getenv("SIGNATURE_MAX_LINES", "8"))
+# Um aviso legal só corta o texto se estiver no fim: depois dele cabem no máximo estas linhas.
+DISCLAIMER_MAX_LINES = int(os.getenv("DISCLAIMER_MAX_LINES", "15"))
+
+# Início do histórico citado: tudo a partir daqui é mensagem anterior. Um bloco De:/From: só conta
+# com endereço de email e uma linha de data logo abaixo; "Em ... escreveu:" precisa de data ou endereço.
+_REPLY_HEADER_RE = re.compile(
+    r"^[ \t>]*(?:"
+    r"(?P<atribuicao>Em\s[^\n]{0,200}?(?:\n[^\n]{0,200}?)?escreveu:"
+    r"|On\s[^\n]{0,200}?(?:\n[^\n]{0,200}?)?wrote:)"
+    r"|-{2,}\s*(?:Original Message|Mensagem original|Forwarded message|Mensagem encaminhada)\s*-{2,}"
+    r"|_{10,}\s*$"
+    r"|(?:De|From):[^\n]*@[^\n]*\n(?:[^\n]*\n){0,2}?[ \t>]*(?:Enviad[oa]|Sent|Data|Date):"
+    r")",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_DATE_OR_ADDRESS_RE = re.compile(r"@|\d{1,2}[/.-]\d{1,2}|\d{1,2}:\d{2}|\b(?:19|20)\d{2}\b")
+
+_DISCLAIMER_RE = re.compile(
+    r"^[ \t]*(?:"
+    r"AVISO\s+(?:LEGAL|DE\s+CONFIDENCIALIDADE)\s*:"
+    r"|CONFIDENTIALITY NOTICE"
+    r"|DISCLAIMER\s*:"
+    r"|Esta mensagem[^\n]{0,80}confidencia"
+    r"|Este e-?mail[^\n]{0,80}confidencia"
+    r"|This (?:e-?mail|message)[^\n]{0,80}confidential"
+    r"|Antes de imprimir"
+    r")",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_MOBILE_FOOTER_RE = re.compile(
+    r"^[ \t]*(?:Enviado do meu|Enviado via|Sent from my|Get Outlook for|Obter o Outlook para)\b[^\n]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_SIG_SEPARATOR_RE = re.compile(r"^-- ?$", re.MULTILINE)
+
+# Fechos formais apenas; "obrigado"/"thanks" costumam ser o próprio conteúdo.
+_SIGN_OFF_RE = re.compile(
+    r"^[ \t]*(?:atenciosamente|att\.?|atte\.?|cordialmente|abra[çc]os?|sauda[çc][õo]es|"
+    r"best regards|kind regards|warm regards|regards|sincerely|best)[ \t]*[,.!]?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_QUOTED_LINE_RE = re.compile(r"^[ \t]*>[^\n]*\n?", re.MULTILINE)
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def _cut(text: str, pattern: "re.Pattern[str]") -> str:
+    m = pattern.search(text)
+    return text[:m.start()] if m else text
+
+
+def _cut_reply_history(text: str) -> str:
+    for m in _REPLY_HEADER_RE.finditer(text):
+        atribuicao = m.group("atribuicao")
+        if atribuicao is None or _DATE_OR_ADDRESS_RE.search(atribuicao):
+            return text[:m.start()]
+    return text
+
+
+def _cut_disclaimer(text: str) -> str:
+    for m in _DISCLAIMER_RE.finditer(text):
+        if not text[:m.start()].strip():
+            continue
+        if text[m.end():].strip().count("\n") < DISCLAIMER_MAX_LINES:
+            return text[:m.start()]
+    return text
+
+
+def _cut_sign_off(text: str) -> str:
+    for m in _SIGN_OFF_RE.finditer(text):
+        if not text[:m.start()].strip():
+            continue
+        if text[m.end():].strip().count("\n") < SIGNATURE_MAX_LINES:
+            return text[:m.start()]
+    return text
+
+
+def trim_email(text: str) -> str:
+    """Mantém só a mensagem mais recente: remove histórico citado, rodapés, avisos legais e assinatura.
+
+    Se o corte não deixar nada (ex.: um encaminhamento sem comentário), devolve o texto original.
+    """
+    if not EMAIL_TRIM_ENABLED or not text:
+        return text
+
+    body = text.replace("\r\n", "\n").replace("\r", "\n")
+    body = _cut_reply_history(body)
+    if ">" in body:
+        body = _QUOTED_LINE_RE.sub("", body)
+    body = _cut_disclaimer(body)
+    body = _cut(body, _SIG_SEPARATOR_RE)
+    body = _MOBILE_FOOTER_RE.sub("", body)
+    body = _cut_sign_off(body)
+    body = _BLANK_LINES_RE.sub("\n\n", body).strip()
+    return body or text
@@ -1,31 +1,340 @@
-from typing import List, Dict
+import os
+import re
+import html
+import tempfile
+import warnings
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
 from fastapi import UploadFile
 from io import BytesIO
+from itertools import islice
 from PyPDF2 import PdfReader
-from .ai_service import process_texts
+from .ai_service import stream_items
+from .workers import run_in_pool
+from .metrics import span
 
-def extract_text_from_file(file_bytes: bytes, filename: str) -> str:
+MAX_FILE_BYTES = int(os.getenv("MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "50"))
+EXTRACT_CHAR_BUDGET = int(os.getenv("EXTRACT_CHAR_BUDGET", "12000"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Bytes de um .txt que cabem no orçamento de caracteres (até 4 bytes por caractere em UTF-8).
+TEXT_HEAD_BYTES = EXTRACT_CHAR_BUDGET * 4
+
+SUPPORTED_EXTENSIONS = (".txt", ".pdf", ".eml", ".msg")
+OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SCRIPT_STYLE_RE = re.compile(r"<(script|style)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+
+# (parte, página ou None, texto)
+Piece = Tuple[str, Optional[int], str]
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _decode_text(file_bytes: bytes) -> str:
+    try:
+        return file_bytes.decode("utf-8", errors="ignore")
+    except Exception:
+        return file_bytes.decode("latin-1", errors="ignore")
+
+
+def _html_to_text(markup: str) -> str:
+    return html.unescape(_TAG_RE.sub(" ", _SCRIPT_STYLE_RE.sub(" ", markup)))
+
+
+def _iter_pdf_pages(stream: BinaryIO, parte: str = "pdf") -> Iterator[Piece]:
+    """Extrai as páginas uma a uma, sob demanda; quem consome decide quando parar."""
+    try:
+        pdf = PdfReader(stream)
+        for numero, page in enumerate(islice(pdf.pages, MAX_PDF_PAGES), 1):
+            try:
+                yield parte, numero, page.extract_text() or ""
+            except Exception:
+                yield parte, numero, ""
+    except Exception:
+        return
+
+
+def _part_text(part: EmailMessage) -> str:
+    try:
+        content = part.get_content()
+    except Exception:
+        payload = part.get_payload(decode=True) or b""
+        content = _decode_text(payload)
+    if isinstance(content, bytes):
+        content = _decode_text(content)
+    if part.get_content_type() == "text/html":
+        content = _html_to_text(content)
+    return content
+
+
+def _iter_message(msg: EmailMessage, prefix: str = "") -> Iterator[Piece]:
+    subject = msg.get("subject")
+    if subject:
+        yield f"{prefix}assunto", None, f"Assunto: {subject}"
+
+    body = msg.get_body(preferencelist=("plain", "html"))
+    if body is not None:
+        yield f"{prefix}corpo", None, _part_text(body)
+
+    for anexo in msg.iter_attachments():
+        nome = anexo.get_filename() or "anexo"
+        tipo = anexo.get_content_type()
+        if tipo == "message/rfc822":
+            inner = anexo.get_content()
+            if isinstance(inner, EmailMessage):
+                yield from _iter_message(inner, prefix=f"{prefix}{nome}/")
+        elif tipo == "application/pdf" or nome.lower().endswith(".pdf"):
+            yield from _iter_pdf_pages(BytesIO(anexo.get_payload(decode=True) or b""), parte=f"{prefix}{nome}")
+        elif tipo.startswith("text/") or nome.lower().endswith(".txt"):
+            yield f"{prefix}{nome}", None, _part_text(anexo)
+
+
+def _iter_outlook_msg(path: str) -> Iterator[Piece]:
+    try:
+        import extract_msg
+    except ImportError:
+        return
+    msg = extract_msg.openMsg(path)
+    try:
+        if msg.subject:
+            yield "assunto", None, f"Assunto: {msg.subject}"
+        yield "corpo", None, msg.body or ""
+        for anexo in msg.attachments:
+            nome = getattr(anexo, "longFilename", None) or getattr(anexo, "shortFilename", None) or "anexo"
+            data = getattr(anexo, "data", None)
+            if not isinstance(data, bytes):
+                continue
+            if nome.lower().endswith(".pdf"):
+                yield from _iter_pdf_pages(BytesIO(data), parte=nome)
+            elif nome.lower().endswith(".txt"):
+                yield nome, None, _decode_text(data)
+    finally:
+        msg.close()
+
+
+def _collect(pieces: Iterable[Piece], budget: int = EXTRACT_CHAR_BUDGET) -> Dict[str, Any]:
+    textos: List[str] = []
+    partes: List[str] = []
+    paginas: List[int] = []
+    paginas_anexos: Dict[str, List[int]] = {}
+    usado = 0
+    truncado = False
+    for parte, pagina, texto in pieces:
+        texto = texto.strip()
+        if not texto:
+            continue
+        restante = budget - usado
+        if len(texto) > restante:
+            texto = texto[:restante]
+            truncado = True
+        textos.append(texto)
+        usado += len(texto)
+        if parte not in partes:
+            partes.append(parte)
+        if pagina is not None:
+            # Só _iter_pdf_pages numera páginas: "pdf" é o próprio arquivo, o resto são PDFs anexados.
+            if parte == "pdf":
+                paginas.append(pagina)
+            else:
+                paginas_anexos.setdefault(parte, []).append(pagina)
+        if usado >= budget:
+            truncado = True
+            break
+    return {
+        "texto": "\n".join(textos),
+        "partes": partes,
+        "paginas_usadas": paginas,
+        "paginas_anexos": paginas_anexos,
+        "truncado": truncado,
+    }
+
+
+def _pieces_from_stream(stream: BinaryIO, filename: str, path: Optional[str] = None) -> Iterator[Piece]:
     name = (filename or "").lower()
     if name.endswith(".txt"):
-        try:
-            return file_bytes.decode("utf-8", errors="ignore")
-        except Exception:
-            return file_bytes.decode("latin-1", errors="ignore")
+        yield "texto", None, _decode_text(stream.read(TEXT_HEAD_BYTES))
     elif name.endswith(".pdf"):
+        yield from _iter_pdf_pages(stream)
+    elif name.endswith(".eml") or name.endswith(".msg"):
+        head = stream.read(len(OLE_MAGIC))
+        stream.seek(0)
+        if head == OLE_MAGIC:
+            if path:
+                yield from _iter_outlook_msg(path)
+            return
+        yield from _iter_message(BytesParser(policy=policy.default).parse(stream))
+
+
+def empty_document(**marcas: bool) -> Dict[str, Any]:
+    """Extração sem texto; `marcas` (ex.: limite_excedido=True) explicam por que nada foi lido."""
+    doc = _collect([])
+    doc.update(marcas)
+    return doc
+
+
+def _outlook_unsupported(fh: BinaryIO, filename: str) -> bool:
+    """True para um .msg do Outlook (OLE) quando o pacote extract_msg não está instalado."""
+    if not (filename or "").lower().endswith(".msg"):
+        return False
+    head = fh.read(len(OLE_MAGIC))
+    fh.seek(0)
+    if head != OLE_MAGIC:
+        return False
+    try:
+        import extract_msg  # noqa: F401
+    except ImportError:
+        warnings.warn("extract_msg não está instalado; arquivos .msg do Outlook não serão lidos.", RuntimeWarning)
+        return True
+    return False
+
+
+def extract_document_from_path(path: str, filename: str) -> Dict[str, Any]:
+    if os.path.getsize(path) > MAX_FILE_BYTES:
+        return empty_document(limite_excedido=True)
+    with open(path, "rb") as fh:
+        if _outlook_unsupported(fh, filename):
+            return empty_document(formato_nao_suportado=True)
+        return _collect(_pieces_from_stream(fh, filename, path))
+
+
+def extract_document(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+    if len(file_bytes) > MAX_FILE_BYTES:
+        return empty_document(limite_excedido=True)
+    name = (filename or "").lower()
+    if name.endswith(".msg") and file_bytes[:len(OLE_MAGIC)] == OLE_MAGIC:
+        fd, path = tempfile.mkstemp(suffix=".msg")
         try:
-            pdf_stream = BytesIO(file_bytes)
-            pdf = PdfReader(pdf_stream)
-            return " ".join(page.extract_text() or "" for page in pdf.pages)
-        except Exception:
-            return ""
-    else:
+            with os.fdopen(fd, "wb") as out:
+                out.write(file_bytes)
+            return extract_document_from_path(path, filename)
+        finally:
+            os.unlink(path)
+    return _collect(_pieces_from_stream(BytesIO(file_bytes), filename))
+
+
+def extract_text_from_file(file_bytes: bytes, filename: str) -> str:
+    return extract_document(file_bytes, filename)["texto"]
+
+
+def extract_text_from_path(path: str, filename: str) -> str:
+    return extract_document_from_path(path, filename)["texto"]
+
+
+async def _spool_to_disk(f: UploadFile, budget: List[int], directory: Optional[str] = None) -> Optional[str]:
+    """Copia o upload em blocos para um arquivo temporário; None se o arquivo excede MAX_FILE_BYTES."""
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(f.filename or "")[1], dir=directory)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await f.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                written += len(chunk)
+                budget[0] -= len(chunk)
+                if budget[0] < 0:
+                    raise UploadTooLarge(f"Requisição excede o limite de {MAX_REQUEST_BYTES} bytes.")
+                if written > MAX_FILE_BYTES:
+                    break
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    if written > MAX_FILE_BYTES:
+        os.unlink(path)
+        return None
+    return path
+
+
+async def save_upload(f: UploadFile, budget: List[int], directory: str) -> Optional[str]:
+    """Guarda o upload em `directory` para extração posterior; "" se o tipo não é suportado, None se excede o limite."""
+    if not (f.filename or "").lower().endswith(SUPPORTED_EXTENSIONS):
         return ""
+    return await _spool_to_disk(f, budget, directory)
 
 
-async def process_files(upload_files: List[UploadFile]) -> List[Dict]:
-    itens = []
+async def extract_saved(path: str, filename: str) -> Dict[str, Any]:
+    if not path or not os.path.exists(path):
+        return _collect([])
+    try:
+        with span("extracao"):
+            return await run_in_pool("pdf", extract_document_from_path, path, filename)
+    except Exception:
+        # Tempo limite, pool quebrado ou arquivo corrompido: custa o resultado deste arquivo, não a requisição.
+        return empty_document(falha_extracao=True)
+
+
+async def extract_bytes(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+    try:
+        with span("extracao"):
+            return await run_in_pool("pdf", extract_document, file_bytes, filename)
+    except Exception:
+        return empty_document(falha_extracao=True)
+
+
+async def _read_text_upload(f: UploadFile, budget: List[int]) -> Optional[bytes]:
+    """Guarda só os TEXT_HEAD_BYTES iniciais; o resto é lido em blocos apenas para aplicar os limites."""
+    head = bytearray()
+    written = 0
+    while True:
+        chunk = await f.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        written += len(chunk)
+        budget[0] -= len(chunk)
+        if budget[0] < 0:
+            raise UploadTooLarge(f"Requisição excede o limite de {MAX_REQUEST_BYTES} bytes.")
+        if written > MAX_FILE_BYTES:
+            return None
+        if len(head) < TEXT_HEAD_BYTES:
+            head.extend(chunk[:TEXT_HEAD_BYTES - len(head)])
+    return bytes(head)
+
+
+async def extract_upload(f: UploadFile, budget: List[int]) -> Dict[str, Any]:
+    name = (f.filename or "").lower()
+    if name.endswith(".txt"):
+        with span("upload"):
+            raw = await _read_text_upload(f, budget)
+        if raw is None:
+            return empty_document(limite_excedido=True)
+        return _collect([("texto", None, _decode_text(raw))])
+    if not name.endswith(SUPPORTED_EXTENSIONS):
+        return _collect([])
+
+    with span("upload"):
+        path = await _spool_to_disk(f, budget)
+    if path is None:
+        return empty_document(limite_excedido=True)
+    try:
+        with span("extracao"):
+            return await run_in_pool("pdf", extract_document_from_path, path, f.filename or "sem_nome")
+    except Exception:
+        return empty_document(falha_extracao=True)
+    finally:
+        os.unlink(path)
+
+
+def upload_name(f: UploadFile) -> str:
+    return f.filename or "sem_nome"
+
+
+async def iter_files(upload_files: List[UploadFile]) -> AsyncIterator[Dict]:
+    budget = [MAX_REQUEST_BYTES]
     for f in upload_files:
-        raw = await f.read()
-        texto = extract_text_from_file(raw, f.filename or "sem_nome")
-        itens.append({"arquivo": f.filename or "sem_nome", "texto": texto})
-    return await process_texts(itens)
+        doc = await extract_upload(f, budget)
+        texto = doc.pop("texto")
+        yield {"arquivo": upload_name(f), "texto": texto, "extracao": doc}
+
+
+async def process_files(upload_files: List[UploadFile]) -> List[Dict]:
+    esperados = [upload_name(f) for f in upload_files]
+    done = [pair async for pair in stream_items(iter_files(upload_files), esperados=esperados)]
+    return [result for _, result in sorted(done, key=lambda pair: pair[0])]
@@ -0,0 +1,169 @@
+import os
+import json
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from .metrics import Counter
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+HTTP_RETRIES = Counter("llm_http_retries_total", "Novas tentativas de chamadas HTTP ao LLM")
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        timeout=HTTP_TIMEOUT,
+        limits=limits,
+    )
+
+
+async def start_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Cliente compartilhado; criado sob demanda fora do ciclo de vida do FastAPI (CLI, validador)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def _retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = min(LLM_BACKOFF_MAX, retry_after) + random.uniform(0, LLM_BACKOFF_BASE)
+    return delay
+
+
+async def post_json_with_retry(
+    url: str,
+    payload: Dict[str, Any],
+    headers: Optional[Dict[str, str]] = None,
+    max_retries: Optional[int] = None,
+) -> httpx.Response:
+    retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    client = get_client()
+
+    attempt = 0
+    while True:
+        try:
+            resp = await client.post(url, headers=headers, json=payload)
+        except httpx.TransportError as e:
+            if attempt >= retries:
+                raise
+            HTTP_RETRIES.inc(motivo=type(e).__name__)
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+
+        if resp.status_code in RETRY_STATUS_CODES and attempt < retries:
+            HTTP_RETRIES.inc(motivo=str(resp.status_code))
+            await asyncio.sleep(backoff_delay(attempt, _retry_after_seconds(resp)))
+            attempt += 1
+            continue
+
+        resp.raise_for_status()
+        return resp
+
+
+async def stream_sse_with_retry(
+    url: str,
+    payload: Dict[str, Any],
+    headers: Optional[Dict[str, str]] = None,
+    max_retries: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Gera os eventos `data:` (JSON) de uma resposta SSE.
+
+    Só há novas tentativas antes do primeiro evento; uma falha no meio do stream é propagada.
+    """
+    retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    client = get_client()
+
+    attempt = 0
+    started = False
+    while True:
+        try:
+            async with client.stream("POST", url, headers=headers, json=payload) as resp:
+                if resp.status_code in RETRY_STATUS_CODES and attempt < retries:
+                    HTTP_RETRIES.inc(motivo=str(resp.status_code))
+                    delay = backoff_delay(attempt, _retry_after_seconds(resp))
+                else:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            return
+                        if data:
+                            started = True
+                            yield json.loads(data)
+                    return
+        except httpx.TransportError as e:
+            if started or attempt >= retries:
+                raise
+            HTTP_RETRIES.inc(motivo=type(e).__name__)
+            delay = backoff_delay(attempt)
+        await asyncio.sleep(delay)
+        attempt += 1
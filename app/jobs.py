@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+
+from .ai_service import stream_texts
+from .file_processor import MAX_REQUEST_BYTES, empty_document, extract_saved, save_upload
+from .metrics import Counter, Gauge
+from .scheduler import request_key
+
+JOBS_DB = os.getenv("JOBS_DB", "data/jobs.db")
+JOBS_DIR = os.getenv("JOBS_DIR", "data/jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "20"))
+JOB_PAGE_SIZE = int(os.getenv("JOB_PAGE_SIZE", "50"))
+
+JOBS_TOTAL = Counter("jobs_total", "Jobs assíncronos por estado final")
+JOBS_ACTIVE = Gauge("jobs_active", "Jobs assíncronos em processamento")
+
+PENDENTE, PROCESSANDO, CONCLUIDO, FALHOU = "pendente", "processando", "concluido", "erro"
+
+
+class JobStore:
+    """Estado dos jobs em SQLite: cada email guarda seu resultado assim que termina.
+
+    Os métodos bloqueiam; no event loop, chame-os com `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                criado REAL NOT NULL,
+                atualizado REAL NOT NULL,
+                erro TEXT
+            );
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT NOT NULL,
+                indice INTEGER NOT NULL,
+                arquivo TEXT NOT NULL,
+                caminho TEXT,
+                texto TEXT,
+                extracao TEXT,
+                resultado TEXT,
+                status TEXT,
+                categoria TEXT,
+                seq INTEGER,
+                PRIMARY KEY (job_id, indice)
+            );
+            """
+        )
+        colunas = {r[1] for r in self._conn.execute("PRAGMA table_info(job_items)")}
+        if "seq" not in colunas:
+            # Bancos criados antes da paginação por ordem de conclusão.
+            self._conn.execute("ALTER TABLE job_items ADD COLUMN seq INTEGER")
+            self._conn.execute("UPDATE job_items SET seq = indice + 1 WHERE resultado IS NOT NULL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS job_items_seq ON job_items (job_id, seq)")
+        self._conn.commit()
+
+    def create(self, job_id: str, items: List[Dict[str, Any]]) -> None:
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, total, criado, atualizado) VALUES (?, ?, ?, ?, ?)",
+                (job_id, PENDENTE, len(items), agora, agora),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, indice, arquivo, caminho, texto, extracao) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, i, it["arquivo"], it.get("caminho"), it.get("texto"),
+                     json.dumps(it["extracao"], ensure_ascii=False) if it.get("extracao") else None)
+                    for i, it in enumerate(items)
+                ],
+            )
+            self._conn.commit()
+
+    def set_status(self, job_id: str, status: str, erro: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, erro = ?, atualizado = ? WHERE id = ?",
+                (status, erro, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY criado", (PENDENTE, PROCESSANDO)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def pending_items(self, job_id: str, limit: int) -> List[Tuple[int, str, Optional[str], Optional[str], Optional[str]]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT indice, arquivo, caminho, texto, extracao FROM job_items "
+                "WHERE job_id = ? AND resultado IS NULL ORDER BY indice LIMIT ?",
+                (job_id, limit),
+            ).fetchall()
+
+    def save_extraction(self, job_id: str, indice: int, texto: str, extracao: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_items SET texto = ?, extracao = ?, caminho = NULL WHERE job_id = ? AND indice = ?",
+                (texto, json.dumps(extracao, ensure_ascii=False), job_id, indice),
+            )
+            self._conn.commit()
+
+    def save_result(self, job_id: str, indice: int, resultado: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_items SET resultado = ?, status = ?, categoria = ?, "
+                "seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM job_items WHERE job_id = ?) "
+                "WHERE job_id = ? AND indice = ?",
+                (
+                    json.dumps(resultado, ensure_ascii=False),
+                    resultado.get("status", "ok"),
+                    resultado["classificacao"]["categoria"],
+                    job_id,
+                    job_id,
+                    indice,
+                ),
+            )
+            self._conn.execute("UPDATE jobs SET atualizado = ? WHERE id = ?", (time.time(), job_id))
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, total, criado, atualizado, erro FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            contagem = self._conn.execute(
+                "SELECT "
+                "COUNT(resultado), "
+                "SUM(status = 'ok' AND categoria = 'PRODUTIVO'), "
+                "SUM(status = 'ok' AND categoria != 'PRODUTIVO'), "
+                "SUM(status != 'ok') "
+                "FROM job_items WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        return {
+            "id": row[0],
+            "status": row[1],
+            "total": row[2],
+            "concluidos": contagem[0] or 0,
+            "produtivos": contagem[1] or 0,
+            "improdutivos": contagem[2] or 0,
+            "erros": contagem[3] or 0,
+            "criado": row[3],
+            "atualizado": row[4],
+            "erro": row[5],
+        }
+
+    def results(self, job_id: str, apos: int, limite: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Resultados na ordem de conclusão, depois do cursor `apos`; devolve (seq, resultado)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, resultado FROM job_items WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, apos, limite),
+            ).fetchall()
+        return [(r[0], json.loads(r[1])) for r in rows]
+
+
+class JobManager:
+    """Fila de jobs consumida por JOB_WORKERS tarefas; retoma o que ficou pendente ao reiniciar."""
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, files_dir: str = JOBS_DIR):
+        self.store = store
+        self.workers = workers
+        self.files_dir = files_dir
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        for job_id in self.store.unfinished():
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(max(1, self.workers))]
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.files_dir, job_id)
+
+    async def submit(self, arquivos: Optional[List[UploadFile]], texto: Optional[str]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        directory = self._job_dir(job_id)
+        os.makedirs(directory, exist_ok=True)
+        items: List[Dict[str, Any]] = []
+        budget = [MAX_REQUEST_BYTES]
+        try:
+            for f in arquivos or []:
+                caminho = await save_upload(f, budget, directory)
+                if caminho is None:
+                    items.append({"arquivo": f.filename or "sem_nome", "texto": "", "extracao": empty_document(limite_excedido=True)})
+                else:
+                    items.append({"arquivo": f.filename or "sem_nome", "caminho": caminho})
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        if texto and texto.strip():
+            items.append({"arquivo": "texto", "texto": texto.strip()})
+
+        await asyncio.to_thread(self.store.create, job_id, items)
+        self._queue.put_nowait(job_id)
+        return {"id": job_id, "status": PENDENTE, "total": len(items)}
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            JOBS_ACTIVE.inc()
+            try:
+                await self._run(job_id)
+            finally:
+                JOBS_ACTIVE.dec()
+
+    async def _materialize(self, job_id: str, row: Tuple) -> Dict[str, Any]:
+        indice, arquivo, caminho, texto, extracao = row
+        if texto is None:
+            doc = await extract_saved(caminho or "", arquivo)
+            texto = doc.pop("texto")
+            await asyncio.to_thread(self.store.save_extraction, job_id, indice, texto, doc)
+            if caminho and os.path.exists(caminho):
+                os.unlink(caminho)
+            extracao = doc
+        elif extracao:
+            extracao = json.loads(extracao)
+        item = {"arquivo": arquivo, "texto": texto}
+        if extracao:
+            item["extracao"] = extracao
+        return item
+
+    async def _run(self, job_id: str) -> None:
+        request_key.set(job_id)
+        await asyncio.to_thread(self.store.set_status, job_id, PROCESSANDO)
+        try:
+            while True:
+                rows = await asyncio.to_thread(self.store.pending_items, job_id, JOB_CHUNK_SIZE)
+                if not rows:
+                    break
+                items = [await self._materialize(job_id, row) for row in rows]
+                async for pos, resultado in stream_texts(items):
+                    await asyncio.to_thread(self.store.save_result, job_id, rows[pos][0], resultado)
+        except asyncio.CancelledError:
+            # Desligamento: o job continua "processando" e é retomado na próxima inicialização.
+            raise
+        except Exception as e:
+            await asyncio.to_thread(self.store.set_status, job_id, FALHOU, erro=str(e))
+            JOBS_TOTAL.inc(status=FALHOU)
+            return
+        await asyncio.to_thread(self.store.set_status, job_id, CONCLUIDO)
+        JOBS_TOTAL.inc(status=CONCLUIDO)
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+
+_manager: Optional[JobManager] = None
+
+
+def get_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        _manager = JobManager(JobStore(JOBS_DB))
+    return _manager
+
+
+def start_jobs() -> None:
+    get_manager().start()
+
+
+async def stop_jobs() -> None:
+    if _manager is not None:
+        await _manager.stop()
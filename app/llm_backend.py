@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import hashlib
+import contextvars
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from .http_client import post_json_with_retry, stream_sse_with_retry
+
+load_dotenv()
+
+DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+LLM_API_KEY = os.getenv("LLM_API_KEY") or os.getenv("GROQ_API_KEY")
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+
+
+class LLMBackend(ABC):
+    """Interface de um provedor de chat; `chat` devolve o JSON no formato chat.completions da OpenAI."""
+
+    name = ""
+    model = ""
+    # Chamadas passam pelo agendador global (RPM/TPM do provedor).
+    rate_limited = True
+
+    @property
+    @abstractmethod
+    def available(self) -> bool:
+        ...
+
+    @abstractmethod
+    async def chat(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Dict[str, Any]:
+        ...
+
+    async def chat_stream(
+        self, messages: List[Dict[str, str]], temperature: float, max_tokens: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Gera chunks no formato chat.completion.chunk; sem suporte a streaming, um único chunk com tudo."""
+        j = await self.chat(messages, temperature=temperature, max_tokens=max_tokens)
+        content = j["choices"][0]["message"]["content"]
+        yield {"choices": [{"index": 0, "delta": {"content": content}}], "usage": j.get("usage")}
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Groq, OpenAI, vLLM, llama.cpp, o stub local e qualquer servidor com /chat/completions."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        base_url: str = LLM_BASE_URL,
+        model: str = LLM_MODEL,
+        api_key: Optional[str] = LLM_API_KEY,
+        streaming: bool = LLM_STREAMING,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self.streaming = streaming
+
+    @property
+    def available(self) -> bool:
+        # Endpoints próprios (ex.: o stub em localhost) podem dispensar chave.
+        return bool(self.api_key) or self.base_url != DEFAULT_BASE_URL
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _payload(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+
+    async def chat(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Dict[str, Any]:
+        payload = self._payload(messages, temperature, max_tokens)
+        resp = await post_json_with_retry(f"{self.base_url}/chat/completions", payload, headers=self._headers())
+        return resp.json()
+
+    async def chat_stream(
+        self, messages: List[Dict[str, str]], temperature: float, max_tokens: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        if not self.streaming:
+            async for chunk in super().chat_stream(messages, temperature, max_tokens):
+                yield chunk
+            return
+        payload = self._payload(messages, temperature, max_tokens)
+        # include_usage traz o consumo no último chunk (OpenAI, vLLM); a Groq o envia em x_groq.usage.
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        async for chunk in stream_sse_with_retry(f"{self.base_url}/chat/completions", payload, headers=self._headers()):
+            yield chunk
+
+
+_backend: Optional[LLMBackend] = None
+
+
+def get_backend() -> LLMBackend:
+    global _backend
+    if _backend is None:
+        _backend = OpenAICompatibleBackend()
+    return _backend
+
+
+def set_backend(backend: Optional[LLMBackend]) -> None:
+    """Troca o backend em uso (None volta ao configurado pelas variáveis de ambiente)."""
+    global _backend
+    _backend = backend
+
+
+# Acumulador por tarefa (ex.: um item do validador): tokens e segundos gastos no LLM.
+call_meter: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("llm_call_meter", default=None)
+
+
+def meter_add(**amounts: float) -> None:
+    meter = call_meter.get()
+    if meter is not None:
+        for k, v in amounts.items():
+            meter[k] = meter.get(k, 0.0) + v
+
+
+def call_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecordingBackend(LLMBackend):
+    """Repassa as chamadas a outro backend e grava cada resposta (JSONL) para reprodução posterior."""
+
+    name = "gravacao"
+
+    def __init__(self, inner: LLMBackend, path: str):
+        self.inner = inner
+        self.model = inner.model
+        self.path = path
+        self._fh = open(path, "a", encoding="utf-8")
+
+    @property
+    def available(self) -> bool:
+        return self.inner.available
+
+    async def chat(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        resposta = await self.inner.chat(messages, temperature=temperature, max_tokens=max_tokens)
+        registro = {
+            "chave": call_key(self.model, messages, temperature, max_tokens),
+            "latencia_s": round(time.perf_counter() - started, 4),
+            "resposta": resposta,
+        }
+        self._fh.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        return resposta
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class ReplayBackend(LLMBackend):
+    """Responde com chamadas gravadas por RecordingBackend, sem rede; a latência gravada vai para o call_meter."""
+
+    name = "reproducao"
+    rate_limited = False
+
+    def __init__(self, path: str, model: str = LLM_MODEL):
+        self.model = model
+        self._gravadas: Dict[str, Dict[str, Any]] = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    registro = json.loads(line)
+                    self._gravadas[registro["chave"]] = registro
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    async def chat(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Dict[str, Any]:
+        registro = self._gravadas.get(call_key(self.model, messages, temperature, max_tokens))
+        if registro is None:
+            raise LookupError("Chamada não encontrada na gravação (prompt ou parâmetros mudaram)")
+        meter_add(latencia_gravada_s=registro.get("latencia_s", 0.0))
+        return registro["resposta"]
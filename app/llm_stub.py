@@ -0,0 +1,213 @@
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DISTRIBUICOES = ("fixa", "normal", "lognormal", "exponencial")
+
+_PRODUTIVO_RE = re.compile(
+    r"solicit|pedid|preciso|precisamos|poderia|urgente|erro|falha|problema|prazo|status|reuni|"
+    r"orçamento|orcamento|suporte|atualiz|contrato|fatura|boleto|reembolso|acesso|\?",
+    re.IGNORECASE,
+)
+_EMAIL_RE = re.compile(r"\nEmail:\n(.*?)\n\nResponda APENAS", re.DOTALL)
+_BATCH_BLOCK_RE = re.compile(r"=== Email (\d+) ===\n(.*?)(?=\n\n=== Email \d+ ===|\n\nResponda APENAS)", re.DOTALL)
+
+RESPOSTA_PADRAO = (
+    "Olá,\n\nRecebemos sua mensagem e agradecemos o contato. "
+    "Nossa equipe já está analisando o assunto e retornará em breve com os próximos passos.\n\n"
+    "Permanecemos à disposição."
+)
+
+
+@dataclass
+class StubConfig:
+    latencia_ms: float = 300.0
+    distribuicao: str = "lognormal"
+    # Dispersão relativa: desvio/média na normal, sigma na lognormal.
+    dispersao: float = 0.5
+    ms_por_token: float = 0.0
+    taxa_erro: float = 0.0
+    taxa_429: float = 0.0
+    rpm: int = 0
+    retry_after: float = 1.0
+    seed: Optional[int] = None
+
+
+def classify_canned(texto: str) -> Dict[str, Any]:
+    produtivo = bool(_PRODUTIVO_RE.search(texto))
+    return {
+        "categoria": "PRODUTIVO" if produtivo else "IMPRODUTIVO",
+        "confianca": 85 if produtivo else 80,
+        "razao": "Resposta simulada pelo stub local.",
+    }
+
+
+def canned_content(prompt: str) -> str:
+    blocos = _BATCH_BLOCK_RE.findall(prompt)
+    if blocos:
+        return json.dumps([{"id": int(i), **classify_canned(t)} for i, t in blocos], ensure_ascii=False)
+    m = _EMAIL_RE.search(prompt)
+    if m:
+        dados = classify_canned(m.group(1))
+        if '"resposta"' in prompt:
+            dados["resposta"] = RESPOSTA_PADRAO
+        return json.dumps(dados, ensure_ascii=False)
+    return RESPOSTA_PADRAO
+
+
+class _Limiter:
+    """Janela deslizante de 60s para simular o limite de requisições por minuto do provedor."""
+
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self._stamps: List[float] = []
+
+    def allow(self) -> bool:
+        if self.rpm <= 0:
+            return True
+        agora = time.monotonic()
+        self._stamps = [t for t in self._stamps if agora - t < 60.0]
+        if len(self._stamps) >= self.rpm:
+            return False
+        self._stamps.append(agora)
+        return True
+
+
+def _sample_latency(cfg: StubConfig, rng: random.Random) -> float:
+    media = cfg.latencia_ms / 1000.0
+    if cfg.distribuicao == "fixa" or media <= 0:
+        return max(media, 0.0)
+    if cfg.distribuicao == "normal":
+        return max(0.0, rng.gauss(media, media * cfg.dispersao))
+    if cfg.distribuicao == "exponencial":
+        return rng.expovariate(1.0 / media)
+    return media * rng.lognormvariate(0.0, cfg.dispersao)
+
+
+def create_app(cfg: Optional[StubConfig] = None) -> FastAPI:
+    cfg = cfg or StubConfig()
+    rng = random.Random(cfg.seed)
+    limiter = _Limiter(cfg.rpm)
+    app = FastAPI(title="LLM stub")
+    app.state.config = cfg
+    app.state.contagem = {"requisicoes": 0, "429": 0, "erros": 0}
+
+    def _erro(status: int, mensagem: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+        return JSONResponse(status_code=status, content={"error": {"message": mensagem}}, headers=headers)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.contagem["requisicoes"] += 1
+
+        if not limiter.allow() or rng.random() < cfg.taxa_429:
+            app.state.contagem["429"] += 1
+            return _erro(429, "Rate limit reached (stub)", {"Retry-After": f"{cfg.retry_after:g}"})
+
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        content = canned_content(prompt)
+        completion_tokens = min(len(content) // 4, int(body.get("max_tokens") or 500))
+        prompt_tokens = len(prompt) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+        if body.get("stream"):
+            await asyncio.sleep(_sample_latency(cfg, rng))
+            if rng.random() < cfg.taxa_erro:
+                app.state.contagem["erros"] += 1
+                return _erro(503, "Service unavailable (stub)")
+            incluir_uso = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                _stream_chunks(body.get("model", "stub"), content, usage if incluir_uso else None),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(_sample_latency(cfg, rng) + completion_tokens * cfg.ms_por_token / 1000.0)
+
+        if rng.random() < cfg.taxa_erro:
+            app.state.contagem["erros"] += 1
+            return _erro(503, "Service unavailable (stub)")
+
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    async def _stream_chunks(model: str, content: str, usage: Optional[Dict[str, int]]):
+        """SSE no formato chat.completion.chunk: uma palavra por chunk, a ms_por_token por ~token."""
+        ident = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        def chunk(choices: List[Dict[str, Any]], **extra: Any) -> str:
+            dados = {"id": ident, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices, **extra}
+            return f"data: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+        yield chunk([{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}])
+        for pedaco in re.findall(r"\S+\s*|\s+", content):
+            await asyncio.sleep(max(1, len(pedaco) // 4) * cfg.ms_por_token / 1000.0)
+            yield chunk([{"index": 0, "delta": {"content": pedaco}, "finish_reason": None}])
+        yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if usage is not None:
+            yield chunk([], usage=usage)
+        yield "data: [DONE]\n\n"
+
+    @app.get("/stub/stats")
+    async def stats():
+        return app.state.contagem
+
+    return app
+
+
+def _main() -> None:
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub local de LLM compatível com a API da OpenAI/Groq")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latencia-ms", type=float, default=300.0, help="latência média (mediana na lognormal)")
+    parser.add_argument("--distribuicao", choices=DISTRIBUICOES, default="lognormal")
+    parser.add_argument("--dispersao", type=float, default=0.5)
+    parser.add_argument("--ms-por-token", type=float, default=0.0, help="tempo extra por token gerado")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração de respostas 503")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="fração de respostas 429 aleatórias")
+    parser.add_argument("--rpm", type=int, default=0, help="limite de requisições por minuto (0 = sem limite)")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    cfg = StubConfig(
+        latencia_ms=args.latencia_ms,
+        distribuicao=args.distribuicao,
+        dispersao=args.dispersao,
+        ms_por_token=args.ms_por_token,
+        taxa_erro=args.taxa_erro,
+        taxa_429=args.taxa_429,
+        rpm=args.rpm,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    _main()
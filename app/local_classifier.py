@@ -0,0 +1,227 @@
+import os
+import csv
+import json
+import random
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError(
+        "NumPy não está instalado. Execute: pip install numpy"
+    )
+
+from .metrics import Counter as MetricCounter
+
+LOCAL_CLASSIFIER_PATH = os.getenv("LOCAL_CLASSIFIER_PATH", "models/local_classifier.npz")
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.9"))
+# Fração mínima dos tokens do email presentes no vocabulário; abaixo disso (ou sem nenhum), vai para o LLM.
+LOCAL_CLASSIFIER_MIN_COVERAGE = float(os.getenv("LOCAL_CLASSIFIER_MIN_COVERAGE", "0.3"))
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "true").lower() == "true"
+
+CLASSES = ("IMPRODUTIVO", "PRODUTIVO")
+
+LOCAL_DECISIONS = MetricCounter("local_classifier_decisions_total", "Decisões do classificador local")
+
+
+@dataclass
+class LocalModel:
+    vocab: Dict[str, int]
+    idf: "np.ndarray"
+    weights: "np.ndarray"
+    bias: float
+
+    def _vectorize(self, tokens: Iterable[str]) -> Tuple["np.ndarray", "np.ndarray"]:
+        counts = Counter(t for t in tokens if t in self.vocab)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        cols = np.fromiter((self.vocab[t] for t in counts), dtype=np.int64, count=len(counts))
+        tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+        vals = tf * self.idf[cols]
+        return cols, vals / np.linalg.norm(vals)
+
+    def coverage(self, tokens: List[str]) -> float:
+        if not tokens:
+            return 0.0
+        return sum(1 for t in tokens if t in self.vocab) / len(tokens)
+
+    def predict_proba(self, tokens: Iterable[str]) -> float:
+        cols, vals = self._vectorize(tokens)
+        z = self.bias + float(vals @ self.weights[cols])
+        return float(1.0 / (1.0 + np.exp(-z)))
+
+    def predict(self, tokens: Iterable[str]) -> Tuple[str, float]:
+        p = self.predict_proba(tokens)
+        if p >= 0.5:
+            return CLASSES[1], p
+        return CLASSES[0], 1.0 - p
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        np.savez_compressed(
+            path,
+            terms=np.array(terms, dtype=str),
+            idf=self.idf,
+            weights=self.weights,
+            bias=np.array([self.bias]),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalModel":
+        with np.load(path, allow_pickle=False) as data:
+            terms = [str(t) for t in data["terms"]]
+            return cls(
+                vocab={t: i for i, t in enumerate(terms)},
+                idf=data["idf"],
+                weights=data["weights"],
+                bias=float(data["bias"][0]),
+            )
+
+
+def _sparse_matrix(docs: List[List[str]], vocab: Dict[str, int], idf: "np.ndarray"):
+    rows, cols, vals = [], [], []
+    for i, tokens in enumerate(docs):
+        counts = Counter(t for t in tokens if t in vocab)
+        if not counts:
+            continue
+        c = np.fromiter((vocab[t] for t in counts), dtype=np.int64, count=len(counts))
+        v = (1.0 + np.log(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))) * idf[c]
+        rows.append(np.full(len(c), i, dtype=np.int64))
+        cols.append(c)
+        vals.append(v / np.linalg.norm(v))
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+
+def train(
+    docs: List[List[str]],
+    labels: List[str],
+    max_features: int = 20000,
+    min_df: int = 1,
+    epochs: int = 500,
+    lr: float = 1.0,
+    l2: float = 1e-3,
+) -> LocalModel:
+    """Regressão logística sobre TF-IDF (esparso em COO, gradiente em lote com NumPy)."""
+    n = len(docs)
+    df = Counter(t for tokens in docs for t in set(tokens))
+    terms = [t for t, c in df.most_common(max_features) if c >= min_df]
+    vocab = {t: i for i, t in enumerate(sorted(terms))}
+    df_arr = np.array([df[t] for t in sorted(terms)], dtype=np.float64)
+    idf = np.log((1.0 + n) / (1.0 + df_arr)) + 1.0
+
+    rows, cols, vals = _sparse_matrix(docs, vocab, idf)
+    y = np.array([1.0 if lbl == CLASSES[1] else 0.0 for lbl in labels])
+    w = np.zeros(len(vocab))
+    b = 0.0
+
+    for _ in range(epochs):
+        z = np.bincount(rows, weights=vals * w[cols], minlength=n) + b
+        p = 1.0 / (1.0 + np.exp(-z))
+        g = (p - y) / n
+        grad_w = np.bincount(cols, weights=vals * g[rows], minlength=len(vocab)) + l2 * w
+        w -= lr * grad_w
+        b -= lr * float(g.sum())
+
+    return LocalModel(vocab=vocab, idf=idf, weights=w, bias=b)
+
+
+_model: Optional[LocalModel] = None
+
+
+def load_model(path: str = LOCAL_CLASSIFIER_PATH) -> Optional[LocalModel]:
+    global _model
+    if LOCAL_CLASSIFIER_ENABLED and path and os.path.exists(path):
+        _model = LocalModel.load(path)
+    else:
+        _model = None
+    return _model
+
+
+def get_model() -> Optional[LocalModel]:
+    return _model
+
+
+def classify_local(tokens: List[str], threshold: float = LOCAL_CLASSIFIER_THRESHOLD) -> Optional[Dict]:
+    """Retorna a classificação local se a confiança atingir o limiar; senão None (segue para o LLM)."""
+    if _model is None or not tokens:
+        return None
+    # Sem tokens conhecidos a probabilidade seria só o viés (a proporção das classes no treino), não uma evidência.
+    cobertura = _model.coverage(tokens)
+    if cobertura == 0 or cobertura < LOCAL_CLASSIFIER_MIN_COVERAGE:
+        LOCAL_DECISIONS.inc(resultado="fora_do_vocabulario")
+        return None
+    categoria, prob = _model.predict(tokens)
+    if prob < threshold:
+        LOCAL_DECISIONS.inc(resultado="encaminhado_llm")
+        return None
+    LOCAL_DECISIONS.inc(resultado="aceito", categoria=categoria)
+    return {
+        "categoria": categoria,
+        "confianca": int(round(prob * 100)),
+        "razao": f"Classificador local (probabilidade {prob:.2f})",
+        "origem": "local",
+    }
+
+
+def load_labeled(path: str) -> List[Dict[str, str]]:
+    """Lê exemplos rotulados de JSONL ou CSV com colunas email/texto e categoria/categoria_esperada."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    items = []
+    for row in rows:
+        texto = row.get("email") or row.get("texto") or ""
+        categoria = str(row.get("categoria_esperada") or row.get("categoria") or "").upper()
+        if texto.strip() and categoria in CLASSES:
+            items.append({"email": texto, "categoria_esperada": categoria})
+    return items
+
+
+def _main() -> None:
+    import argparse
+    from .nlp_processor import analyze_email
+    from .email_trim import trim_email
+    from .prompts import get_validation_set
+
+    parser = argparse.ArgumentParser(description="Treina o classificador local (TF-IDF + regressão logística)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    tr = sub.add_parser("train", help="treina e salva o artefato do modelo")
+    tr.add_argument("--data", action="append", default=[], help="arquivo JSONL/CSV rotulado (pode repetir)")
+    tr.add_argument("--sem-validacao", action="store_true", help="não incluir prompts.VALIDATION_SET no treino")
+    tr.add_argument("--out", default=LOCAL_CLASSIFIER_PATH)
+    tr.add_argument("--holdout", type=float, default=0.0, help="fração reservada para medir acurácia")
+    tr.add_argument("--epochs", type=int, default=500)
+    args = parser.parse_args()
+
+    items = [] if args.sem_validacao else list(get_validation_set())
+    for path in args.data:
+        items.extend(load_labeled(path))
+    if not items:
+        raise SystemExit("Nenhum exemplo rotulado para treinar.")
+
+    random.Random(42).shuffle(items)
+    n_test = int(len(items) * args.holdout)
+    test, train_items = items[:n_test], items[n_test:]
+
+    docs = [analyze_email(trim_email(it["email"])).stemmed or [] for it in train_items]
+    model = train(docs, [it["categoria_esperada"] for it in train_items], epochs=args.epochs)
+    model.save(args.out)
+    print(f"Modelo salvo em {args.out} ({len(train_items)} exemplos, {len(model.vocab)} termos)")
+
+    if test:
+        acertos = sum(
+            model.predict(analyze_email(trim_email(it["email"])).stemmed or [])[0] == it["categoria_esperada"] for it in test
+        )
+        print(f"Acurácia no holdout: {acertos / len(test) * 100:.2f}% ({len(test)} exemplos)")
+
+
+if __name__ == "__main__":
+    _main()
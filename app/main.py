@@ -1,14 +1,99 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from .models import ProcessResponse
-from .file_processor import process_files
-from .ai_service import process_texts
+from .models import ProcessResponse, Resultado, ResumoProcessamento, JobCriado, JobStatus, JobResultados
+from .file_processor import process_files, iter_files, upload_name, UploadTooLarge, MAX_REQUEST_BYTES
+from .ai_service import process_texts, stream_items, set_request_deadline, REQUESTS_ABORTED, USE_NLP_PREPROCESSING
+from .nlp_processor import ensure_resources
+from .local_classifier import load_model
+from .http_client import start_client, close_client
+from .scheduler import request_key
+from .cache import cache_bypass
+from .metrics import Gauge, Histogram, render_prometheus, request_timings, span, timings_report
+from .workers import start_workers, stop_workers
+from .jobs import get_manager, start_jobs, stop_jobs, JOB_PAGE_SIZE, PENDENTE, PROCESSANDO
 import os
+import json
+import time
+import uuid
+import asyncio
 
-app = FastAPI(title="AutoEmail - Classificador")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if USE_NLP_PREPROCESSING:
+        ensure_resources()
+        load_model()
+    await start_client()
+    start_workers()
+    start_jobs()
+    yield
+    await stop_jobs()
+    stop_workers()
+    await close_client()
+
+
+app = FastAPI(title="AutoEmail - Classificador", lifespan=lifespan)
+
+class RequestSizeLimit:
+    """Recusa com 413 requisições cujo Content-Length já excede o limite, antes de ler o corpo."""
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            length = dict(scope.get("headers") or []).get(b"content-length", b"")
+            if length.isdigit() and int(length) > self.max_bytes:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Requisição excede o limite de {self.max_bytes} bytes."}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "Duração das requisições HTTP por rota")
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requisições HTTP em andamento")
+
+
+class RequestMetrics:
+    """Mede duração e concorrência das requisições por rota e status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"codigo": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["codigo"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # O template da rota (/jobs/{job_id}) evita uma série por id.
+            route = scope.get("route")
+            rota = getattr(route, "path", None) or "nao_roteado"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, rota=rota, status=str(status["codigo"]))
+
+
+app.add_middleware(RequestSizeLimit, max_bytes=MAX_REQUEST_BYTES)
+
+app.add_middleware(RequestMetrics)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,20 +112,213 @@ async def serve_frontend():
         return f.read()
 
 
+def _begin_request(cache_control: Optional[str], tempos: bool = False, prazo: Optional[float] = None) -> None:
+    request_key.set(uuid.uuid4().hex)
+    cache_bypass.set("no-cache" in (cache_control or "").lower())
+    request_timings.set({} if tempos else None)
+    set_request_deadline(prazo)
+
+
+def _timings() -> Optional[dict]:
+    timings = request_timings.get()
+    return timings_report(timings) if timings is not None else None
+
+
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def _wait_disconnect(request: Request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+async def _unless_disconnected(request: Request, coro):
+    """Executa `coro`; se o cliente desconectar antes, cancela-o junto com as chamadas ao LLM pendentes."""
+    trabalho = asyncio.ensure_future(coro)
+    vigia = asyncio.ensure_future(_wait_disconnect(request))
+    try:
+        await asyncio.wait({trabalho, vigia}, return_when=asyncio.FIRST_COMPLETED)
+        if trabalho.done():
+            return trabalho.result()
+        REQUESTS_ABORTED.inc(motivo="desconexao")
+        raise ClientDisconnected()
+    finally:
+        vigia.cancel()
+        trabalho.cancel()
+
+
 @app.post("/process", response_model=ProcessResponse)
 async def process_email(
+    request: Request,
     texto: Optional[str] = Form(None),
-    arquivo: Optional[List[UploadFile]] = File(None)
+    arquivo: Optional[List[UploadFile]] = File(None),
+    cache_control: Optional[str] = Header(None),
+    x_request_deadline: Optional[float] = Header(None, gt=0, description="prazo da requisição em segundos"),
+    tempos: bool = Query(False, description="inclui o tempo gasto por etapa na resposta")
 ):
-    resultados = []
+    _begin_request(cache_control, tempos, x_request_deadline)
 
-    if arquivo:
-        resultados.extend(await process_files(arquivo))
+    if not arquivo and not (texto and texto.strip()):
+        raise HTTPException(status_code=400, detail="Nenhum arquivo ou texto enviado.")
 
+    async def processar() -> list:
+        resultados = []
+        with span("requisicao"):
+            if arquivo:
+                resultados.extend(await process_files(arquivo))
+            if texto and texto.strip():
+                resultados.extend(await process_texts([{"arquivo": "texto", "texto": texto.strip()}]))
+        return resultados
+
+    try:
+        resultados = await _unless_disconnected(request, processar())
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ClientDisconnected:
+        # 499: convenção do nginx para "cliente fechou a conexão"; só aparece nas métricas e logs.
+        return JSONResponse(status_code=499, content={"detail": "Cliente desconectou; processamento cancelado."})
+
+    return ProcessResponse(resultados=resultados, tempos=_timings())
+
+
+def _ndjson(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _request_names(arquivo: Optional[List[UploadFile]], texto: Optional[str]) -> List[str]:
+    """Nomes dos itens na ordem de _request_items, para reportar os não lidos quando o prazo esgota."""
+    return [upload_name(f) for f in arquivo or []] + (["texto"] if texto and texto.strip() else [])
+
+
+async def _request_items(arquivo: Optional[List[UploadFile]], texto: Optional[str]):
+    if arquivo:
+        async for item in iter_files(arquivo):
+            yield item
     if texto and texto.strip():
-        resultados.extend(await process_texts([{"arquivo": "texto", "texto": texto.strip()}]))
+        yield {"arquivo": "texto", "texto": texto.strip()}
+
+
+@app.post("/process/stream")
+async def process_email_stream(
+    texto: Optional[str] = Form(None),
+    arquivo: Optional[List[UploadFile]] = File(None),
+    cache_control: Optional[str] = Header(None),
+    x_request_deadline: Optional[float] = Header(None, gt=0, description="prazo da requisição em segundos"),
+    tempos: bool = Query(False, description="inclui o tempo gasto por etapa no resumo"),
+    parcial: bool = Query(False, description="envia a classificação e a resposta em pedaços antes do resultado")
+):
+    _begin_request(cache_control, tempos, x_request_deadline)
+    esperados = _request_names(arquivo, texto)
+    total = len(esperados)
 
-    if not resultados:
+    if not total:
         raise HTTPException(status_code=400, detail="Nenhum arquivo ou texto enviado.")
 
-    return ProcessResponse(resultados=resultados)
+    async def gerar():
+        resumo = ResumoProcessamento(total=0, produtivos=0, improdutivos=0, erros=0)
+        fila: "asyncio.Queue[Optional[dict]]" = asyncio.Queue()
+
+        def on_partial(indice: int, evento: dict) -> None:
+            if "delta" in evento:
+                fila.put_nowait({"tipo": "resposta_parcial", "indice": indice, "delta": evento["delta"]})
+            else:
+                fila.put_nowait({"tipo": "classificacao", "indice": indice, **evento})
+
+        async def produzir() -> None:
+            try:
+                async for indice, item in stream_items(
+                    _request_items(arquivo, texto), on_partial if parcial else None, esperados
+                ):
+                    fila.put_nowait({"tipo": "resultado", "indice": indice, "resultado": Resultado(**item)})
+            except Exception as e:
+                fila.put_nowait({"tipo": "erro", "detalhe": str(e)})
+            finally:
+                fila.put_nowait(None)
+
+        yield _ndjson({"tipo": "inicio", "total": total})
+        produtor = asyncio.ensure_future(produzir())
+        try:
+            while (registro := await fila.get()) is not None:
+                if registro["tipo"] == "resultado":
+                    resultado = registro["resultado"]
+                    resumo.total += 1
+                    if resultado.status == "tempo_esgotado":
+                        resumo.tempo_esgotado += 1
+                    if resultado.status != "ok":
+                        resumo.erros += 1
+                    elif resultado.classificacao.categoria == "PRODUTIVO":
+                        resumo.produtivos += 1
+                    else:
+                        resumo.improdutivos += 1
+                    registro["resultado"] = resultado.model_dump()
+                yield _ndjson(registro)
+        except (asyncio.CancelledError, GeneratorExit):
+            # O StreamingResponse cancela o gerador quando o cliente desconecta.
+            REQUESTS_ABORTED.inc(motivo="desconexao")
+            raise
+        finally:
+            produtor.cancel()
+        resumo_final = resumo.model_dump()
+        if tempos:
+            resumo_final["tempos"] = _timings()
+        yield _ndjson({"tipo": "resumo", **resumo_final})
+
+    return StreamingResponse(gerar(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", response_model=JobCriado, status_code=202)
+async def create_job(
+    texto: Optional[str] = Form(None),
+    arquivo: Optional[List[UploadFile]] = File(None),
+):
+    if not arquivo and not (texto and texto.strip()):
+        raise HTTPException(status_code=400, detail="Nenhum arquivo ou texto enviado.")
+    try:
+        return await get_manager().submit(arquivo, texto)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+async def _job_or_404(job_id: str) -> dict:
+    job = await asyncio.to_thread(get_manager().store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return job
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def job_status(job_id: str):
+    return await _job_or_404(job_id)
+
+
+@app.get("/jobs/{job_id}/results", response_model=JobResultados)
+async def job_results(
+    job_id: str,
+    apos: int = Query(0, ge=0),
+    limite: int = Query(JOB_PAGE_SIZE, ge=1, le=500),
+):
+    job = await _job_or_404(job_id)
+    # Cursor na ordem de conclusão: resultados que terminam depois entram no fim, sem deslocar as páginas já lidas.
+    pagina = await asyncio.to_thread(get_manager().store.results, job_id, apos, limite + 1)
+    mais = len(pagina) > limite
+    pagina = pagina[:limite]
+    cursor = pagina[-1][0] if pagina else apos
+    em_andamento = job["status"] in (PENDENTE, PROCESSANDO)
+    return JobResultados(
+        id=job_id,
+        status=job["status"],
+        total=job["total"],
+        apos=apos,
+        limite=limite,
+        proximo=cursor if mais or em_andamento else None,
+        resultados=[r for _, r in pagina],
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return render_prometheus()
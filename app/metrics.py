@@ -0,0 +1,179 @@
+import time
+import functools
+import threading
+import contextvars
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_REGISTRY: List["_Metric"] = []
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    # Formato texto do Prometheus: \\, \" e \n são os únicos escapes nos valores de label.
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels: str) -> int:
+        counts = self._counts.get(_label_key(labels))
+        return counts[-1] if counts else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', repr(bound))])} {c}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {counts[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {self._sums[key]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("stage_seconds", "Duração de cada etapa do processamento")
+
+# Quando definido (ex.: ?tempos=true), acumula por etapa o tempo da requisição atual.
+request_timings: contextvars.ContextVar[Optional[Dict[str, Dict[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def record_stage(etapa: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, etapa=etapa)
+    timings = request_timings.get()
+    if timings is not None:
+        t = timings.setdefault(etapa, {"total_s": 0.0, "chamadas": 0})
+        t["total_s"] += seconds
+        t["chamadas"] += 1
+
+
+@contextmanager
+def span(etapa: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(etapa, time.perf_counter() - started)
+
+
+def timed(etapa: str) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """Decorador de corrotinas equivalente a `with span(etapa)` em volta do corpo."""
+    def decorator(fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(etapa):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timings_report(timings: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        etapa: {"total_s": round(t["total_s"], 4), "chamadas": int(t["chamadas"])}
+        for etapa, t in sorted(timings.items())
+    }
+
+
+def render_prometheus() -> str:
+    return "\n".join(m.render() for m in _REGISTRY) + "\n"
@@ -1,15 +1,65 @@
 from pydantic import BaseModel, conint
-from typing import List
+from typing import Dict, List, Optional
 
 class Classificacao(BaseModel):
     categoria: str
     confianca: conint(ge=0, le=100)
     razao: str
 
+class Extracao(BaseModel):
+    partes: List[str] = []
+    paginas_usadas: List[int] = []
+    paginas_anexos: Dict[str, List[int]] = {}
+    truncado: bool = False
+    limite_excedido: bool = False
+    falha_extracao: bool = False
+    formato_nao_suportado: bool = False
+
 class Resultado(BaseModel):
     arquivo: str
     classificacao: Classificacao
     resposta: str
+    status: str = "ok"
+    extracao: Optional[Extracao] = None
+    duplicado_de: Optional[str] = None
+
+class TempoEtapa(BaseModel):
+    total_s: float
+    chamadas: int
 
 class ProcessResponse(BaseModel):
     resultados: List[Resultado]
+    tempos: Optional[Dict[str, TempoEtapa]] = None
+
+class ResumoProcessamento(BaseModel):
+    total: int
+    produtivos: int
+    improdutivos: int
+    erros: int
+    tempo_esgotado: int = 0
+
+class JobCriado(BaseModel):
+    id: str
+    status: str
+    total: int
+
+class JobStatus(BaseModel):
+    id: str
+    status: str
+    total: int
+    concluidos: int
+    produtivos: int
+    improdutivos: int
+    erros: int
+    criado: float
+    atualizado: float
+    erro: Optional[str] = None
+
+class JobResultados(BaseModel):
+    id: str
+    status: str
+    total: int
+    apos: int
+    limite: int
+    proximo: Optional[int] = None
+    resultados: List[Resultado]
@@ -1,5 +1,11 @@
+import os
 import re
-from typing import List, Set
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set
 
 try:
     import nltk
@@ -18,42 +24,119 @@ except ImportError:
         "Unidecode não está instalado. Execute: pip install unidecode"
     )
 
-for resource in ['punkt', 'punkt_tab', 'stopwords', 'rslp']:
-    try:
-        nltk.download(resource, quiet=True)
-    except (LookupError, OSError, Exception) as e:
-        continue
+from .metrics import span
 
-STOPWORDS_PT: Set[str] = set(stopwords.words('portuguese'))
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", "")
 
-STEMMER = RSLPStemmer()
+if NLTK_DATA_DIR and NLTK_DATA_DIR not in nltk.data.path:
+    nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+NLTK_RESOURCES = {
+    'punkt_tab': 'tokenizers/punkt_tab/portuguese',
+    'stopwords': 'corpora/stopwords/portuguese',
+    'rslp': 'stemmers/rslp/step0.pt',
+}
 
 CUSTOM_STOPWORDS = {
     'email', 'assunto', 'att', 'atenciosamente', 'cordialmente',
     'prezado', 'prezada', 'senhor', 'senhora', 'sr', 'sra'
 }
 
-STOPWORDS_PT.update(CUSTOM_STOPWORDS)
 
-def clean_text(text: str) -> str:
-    text = re.sub(r'https?://(?:[a-zA-Z]|[0-9]|[$\-_@.&+]|[!*(),]|%[0-9a-fA-F][0-9a-fA-F])+', '', text)
+class NlpResourcesMissing(RuntimeError):
+    pass
+
+
+def missing_resources() -> List[str]:
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+def ensure_resources() -> None:
+    missing = missing_resources()
+    if missing:
+        raise NlpResourcesMissing(
+            f"Recursos NLTK ausentes: {', '.join(missing)}. "
+            f"Execute: python -m app.nlp_processor fetch"
+            + (f" --dir {NLTK_DATA_DIR}" if NLTK_DATA_DIR else "")
+        )
+
+
+def fetch_resources(download_dir: Optional[str] = None) -> bool:
+    ok = True
+    for name in NLTK_RESOURCES:
+        ok = nltk.download(name, download_dir=download_dir or NLTK_DATA_DIR or None, quiet=True) and ok
+    return ok
+
+
+@lru_cache(maxsize=None)
+def _resources_ready() -> bool:
+    ensure_resources()
+    return True
+
+
+@lru_cache(maxsize=None)
+def get_stopwords() -> Set[str]:
+    _resources_ready()
+    return set(stopwords.words('portuguese')) | CUSTOM_STOPWORDS
 
-    text = re.sub(r'\S+@\S+', '', text)
 
-    text = re.sub(r'\(?\d{2,3}\)?\s?\d{4,5}-?\d{4}', '', text)
+@lru_cache(maxsize=None)
+def get_stemmer() -> RSLPStemmer:
+    _resources_ready()
+    return RSLPStemmer()
 
-    text = re.sub(r'[^\w\s.,!?;:\-áéíóúâêîôûãõàèìòùäëïöüçÁÉÍÓÚÂÊÎÔÛÃÕÀÈÌÒÙÄËÏÖÜÇ]', ' ', text)
 
-    text = re.sub(r'\s+', ' ', text)
+def __getattr__(name: str) -> Any:
+    if name == 'STOPWORDS_PT':
+        return get_stopwords()
+    if name == 'STEMMER':
+        return get_stemmer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+STEM_CACHE_SIZE = int(os.getenv("STEM_CACHE_SIZE", "50000"))
+
+_URL_RE = re.compile(r'https?://(?:[a-zA-Z]|[0-9]|[$\-_@.&+]|[!*(),]|%[0-9a-fA-F][0-9a-fA-F])+')
+_EMAIL_RE = re.compile(r'\S+@\S+')
+_PHONE_RE = re.compile(r'\(?\d{2,3}\)?\s?\d{4,5}-?\d{4}')
+_DIGIT_RE = re.compile(r'\d')
+# Complemento do conjunto permitido sem excluir \s: troca caracteres não permitidos
+# por espaço e colapsa espaços num único passo.
+_NOISE_AND_SPACE_RE = re.compile(r'[^\w.,!?;:\-áéíóúâêîôûãõàèìòùäëïöüçÁÉÍÓÚÂÊÎÔÛÃÕÀÈÌÒÙÄËÏÖÜÇ]+')
+_TOKEN_SEP = '\x00'
+
+
+def clean_text(text: str) -> str:
+    if 'http' in text:
+        text = _URL_RE.sub('', text)
+
+    if '@' in text:
+        text = _EMAIL_RE.sub('', text)
+
+    if _DIGIT_RE.search(text):
+        text = _PHONE_RE.sub('', text)
+
+    text = _NOISE_AND_SPACE_RE.sub(' ', text)
     return text.strip()
 
 
 def remove_stopwords(tokens: List[str]) -> List[str]:
-    return [token for token in tokens if token.lower() not in STOPWORDS_PT]
+    stopwords_pt = get_stopwords()
+    return [token for token in tokens if token.lower() not in stopwords_pt]
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def _stem(token: str) -> str:
+    return get_stemmer().stem(token)
 
 
 def apply_stemming(tokens: List[str]) -> List[str]:
-    return [STEMMER.stem(token) for token in tokens]
+    return [_stem(token) for token in tokens]
 
 
 def normalize_text(text: str) -> str:
@@ -62,12 +145,44 @@ def normalize_text(text: str) -> str:
     return text
 
 
-def preprocess_email(text: str, apply_stem: bool = True) -> dict:
+def _normalize_tokens(tokens: List[str]) -> List[str]:
+    """normalize_text token a token, numa só chamada; os tokens não podem conter _TOKEN_SEP (clean_text o remove)."""
+    if not tokens:
+        return []
+    return normalize_text(_TOKEN_SEP.join(tokens)).split(_TOKEN_SEP)
+
+
+NLP_MEMO_SIZE = int(os.getenv("NLP_MEMO_SIZE", "1024"))
+KEYWORDS_TOP_N = 5
+
+
+@dataclass(frozen=True)
+class NlpResult:
+    original: str
+    cleaned: str
+    tokens: List[str]
+    stemmed: Optional[List[str]]
+    processed: str
+    stats: Dict[str, Any]
+    keywords: List[str]
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data.pop('keywords')
+        return data
+
+
+def _top_keywords(tokens: List[str], top_n: int) -> List[str]:
+    return [word for word, _ in Counter(tokens).most_common(top_n)]
+
+
+def _run_pipeline(text: str, apply_stem: bool = True) -> NlpResult:
+    _resources_ready()
     cleaned = clean_text(text)
 
     tokens = word_tokenize(cleaned, language='portuguese')
 
-    tokens = [normalize_text(token) for token in tokens if len(token) > 2]
+    tokens = _normalize_tokens([token for token in tokens if len(token) > 2])
 
     tokens_no_stop = remove_stopwords(tokens)
 
@@ -88,24 +203,71 @@ def preprocess_email(text: str, apply_stem: bool = True) -> dict:
         'reduction_percentage': round((1 - len(final_tokens) / max(len(tokens), 1)) * 100, 2)
     }
 
-    return {
-        'original': text,
-        'cleaned': cleaned,
-        'tokens': tokens_no_stop,
-        'stemmed': final_tokens if apply_stem else None,
-        'processed': processed_text,
-        'stats': stats
-    }
+    return NlpResult(
+        original=text,
+        cleaned=cleaned,
+        tokens=tokens_no_stop,
+        stemmed=final_tokens if apply_stem else None,
+        processed=processed_text,
+        stats=stats,
+        keywords=_top_keywords(final_tokens, KEYWORDS_TOP_N),
+    )
 
 
-def extract_keywords(text: str, top_n: int = 5) -> List[str]:
-    processed = preprocess_email(text, apply_stem=True)
-    tokens = processed['stemmed'] or processed['tokens']
+_memo: "OrderedDict[str, NlpResult]" = OrderedDict()
+_memo_lock = threading.Lock()
+
 
-    from collections import Counter
-    freq = Counter(tokens)
+def analyze_email(text: str, apply_stem: bool = True) -> NlpResult:
+    """Pipeline NLP completo, calculado uma vez por conteúdo e reaproveitado."""
+    key = hashlib.sha256(f"{int(apply_stem)}:{text}".encode("utf-8")).hexdigest()
+    with _memo_lock:
+        cached = _memo.get(key)
+        if cached is not None:
+            _memo.move_to_end(key)
+            return cached
 
-    return [word for word, _ in freq.most_common(top_n)]
+    with span("nlp_pipeline"):
+        result = _run_pipeline(text, apply_stem)
+
+    with _memo_lock:
+        _memo[key] = result
+        while len(_memo) > NLP_MEMO_SIZE:
+            _memo.popitem(last=False)
+    return result
+
+
+def preprocess_email(text: str, apply_stem: bool = True) -> dict:
+    return analyze_email(text, apply_stem).as_dict()
+
+
+def extract_keywords(text: str, top_n: int = 5) -> List[str]:
+    processed = analyze_email(text, apply_stem=True)
+    if top_n == KEYWORDS_TOP_N:
+        return list(processed.keywords)
+    return _top_keywords(processed.stemmed or processed.tokens, top_n)
 
 def quick_preprocess(text: str) -> str:
-    return preprocess_email(text, apply_stem=True)['processed']
\ No newline at end of file
+    return analyze_email(text, apply_stem=True).processed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gerencia os recursos NLTK usados pelo pipeline NLP")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    fetch = sub.add_parser("fetch", help="baixa os recursos NLTK necessários")
+    fetch.add_argument("--dir", default=None, help="diretório de dados NLTK (padrão: NLTK_DATA_DIR)")
+    sub.add_parser("verify", help="verifica se os recursos estão disponíveis localmente")
+    args = parser.parse_args()
+
+    if args.comando == "fetch":
+        if args.dir and args.dir not in nltk.data.path:
+            nltk.data.path.insert(0, args.dir)
+        fetch_resources(args.dir)
+
+    faltando = missing_resources()
+    if faltando:
+        print(f"Recursos ausentes: {', '.join(faltando)}")
+        raise SystemExit(1)
+    print("Recursos NLTK disponíveis.")
@@ -1,3 +1,7 @@
+from typing import List
+
+PROMPT_VERSION = "1"
+
 FEW_SHOT_EXAMPLES = """
 Exemplos de classificação:
 
@@ -56,6 +60,27 @@ Responda APENAS no formato JSON:
 """
 
 
+def get_batch_classification_prompt(emails: List[str]) -> str:
+    blocos = "\n\n".join(f"=== Email {i} ===\n{email}" for i, email in enumerate(emails, 1))
+    return f"""Você é um assistente especializado em classificar emails corporativos.
+
+{FEW_SHOT_EXAMPLES}
+
+Agora classifique CADA um dos {len(emails)} emails abaixo seguindo o mesmo padrão dos exemplos:
+
+Classifique cada email em uma das categorias:
+- PRODUTIVO: Requer ação, resposta ou acompanhamento (reunião, prazo, rh, orçamento, suporte técnico, atualização de dados, etc)
+- IMPRODUTIVO: Não requer ação imediata (saudações, agradecimentos, felicitações, cupons, spam, etc)
+
+{blocos}
+
+Responda APENAS com um array JSON contendo exatamente {len(emails)} objetos, um por email, na mesma ordem:
+[
+  {{"id": 1, "categoria": "PRODUTIVO" ou "IMPRODUTIVO", "confianca": 0-100, "razao": "breve explicação baseada no contexto"}}
+]
+"""
+
+
 def get_response_prompt(email_content: str, categoria: str) -> str:
     if categoria == "PRODUTIVO":
         contexto = """Para emails PRODUTIVOS:
@@ -87,6 +112,35 @@ A resposta deve:
 Gere apenas a resposta, sem explicações adicionais.
 """
 
+def get_classification_and_response_prompt(email_content: str) -> str:
+    return f"""Você é um assistente especializado em classificar emails corporativos e redigir respostas automáticas.
+
+{FEW_SHOT_EXAMPLES}
+
+Agora classifique o email abaixo seguindo o mesmo padrão dos exemplos e redija uma resposta para ele:
+
+Classifique o email em uma das categorias:
+- PRODUTIVO: Requer ação, resposta ou acompanhamento (reunião, prazo, rh, orçamento, suporte técnico, atualização de dados, etc)
+- IMPRODUTIVO: Não requer ação imediata (saudações, agradecimentos, felicitações, cupons, spam, etc)
+
+A resposta deve:
+- Se PRODUTIVO: reconhecer a solicitação, indicar os próximos passos ou prazo e ser específica e objetiva
+- Se IMPRODUTIVO: ser breve, educada e cordial, sem criar expectativas de ação
+- Ter 2-3 parágrafos curtos, em tom profissional mas amigável
+- Não incluir assinatura (será adicionada automaticamente)
+
+Email:
+{email_content}
+
+Responda APENAS no formato JSON:
+{{
+  "categoria": "PRODUTIVO" ou "IMPRODUTIVO",
+  "confianca": 0-100,
+  "razao": "breve explicação baseada no contexto",
+  "resposta": "texto da resposta sugerida"
+}}
+"""
+
 VALIDATION_SET = [
     {
         "email": "Preciso urgentemente do relatório financeiro do Q1. Prazo até sexta-feira.",
@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, List, Dict, Optional
+
+from .metrics import Gauge, Histogram, Counter
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "30000"))
+
+QUEUE_DEPTH = Gauge("llm_scheduler_queue_depth", "Chamadas ao LLM aguardando vaga no agendador")
+IN_FLIGHT = Gauge("llm_scheduler_in_flight", "Chamadas ao LLM em andamento")
+QUEUE_WAIT = Histogram("llm_scheduler_wait_seconds", "Tempo de espera na fila do agendador")
+DISPATCHED = Counter("llm_scheduler_dispatched_total", "Chamadas liberadas pelo agendador")
+
+# Chave de justiça da fila: cada requisição HTTP define a sua, e as tarefas
+# filhas herdam o valor pelo contexto do asyncio.
+request_key: contextvars.ContextVar[str] = contextvars.ContextVar("llm_request_key", default="default")
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    chars = sum(len(m.get("content", "")) for m in messages)
+    return max(1, chars // 4)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class _Ticket:
+    __slots__ = ("cost", "future", "enqueued_at")
+
+    def __init__(self, cost: int, future: asyncio.Future):
+        self.cost = cost
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Limita chamadas simultâneas, requisições/min e tokens/min, com fila justa por requisição."""
+
+    def __init__(self, max_in_flight: int, requests_per_minute: float, tokens_per_minute: float):
+        self.max_in_flight = max(1, max_in_flight)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._reset()
+
+    def _reset(self) -> None:
+        self._queues: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._in_flight = 0
+        self._rpm = TokenBucket(self.requests_per_minute)
+        self._tpm = TokenBucket(self.tokens_per_minute)
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        QUEUE_DEPTH.set(0)
+        IN_FLIGHT.set(0)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _ensure_dispatcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._reset()
+            self._loop = loop
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            while queue and queue[0].future.done():
+                queue.popleft()
+            if queue:
+                return queue[0]
+            del self._queues[key]
+        return None
+
+    def _pop_ticket(self) -> None:
+        key, queue = next(iter(self._queues.items()))
+        queue.popleft()
+        self._queues.move_to_end(key)
+        if not queue:
+            del self._queues[key]
+
+    async def _dispatch(self) -> None:
+        while True:
+            ticket = self._next_ticket() if self._in_flight < self.max_in_flight else None
+            if ticket is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = max(self._rpm.wait_time(1), self._tpm.wait_time(ticket.cost))
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            self._rpm.consume(1)
+            self._tpm.consume(ticket.cost)
+            self._pop_ticket()
+            self._in_flight += 1
+            IN_FLIGHT.set(self._in_flight)
+            QUEUE_DEPTH.set(self.queue_depth)
+            QUEUE_WAIT.observe(time.monotonic() - ticket.enqueued_at)
+            DISPATCHED.inc()
+            ticket.future.set_result(None)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        IN_FLIGHT.set(self._in_flight)
+        self._wakeup.set()
+
+    @asynccontextmanager
+    async def slot(self, cost: int, key: Optional[str] = None) -> AsyncIterator[None]:
+        self._ensure_dispatcher()
+        ticket = _Ticket(cost, self._loop.create_future())
+        self._queues.setdefault(key or request_key.get(), deque()).append(ticket)
+        QUEUE_DEPTH.set(self.queue_depth)
+        self._wakeup.set()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                self._release()
+            else:
+                ticket.future.cancel()
+                QUEUE_DEPTH.set(self.queue_depth)
+            raise
+
+        try:
+            yield
+        finally:
+            self._release()
+
+
+SCHEDULER = LLMScheduler(LLM_MAX_IN_FLIGHT, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
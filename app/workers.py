@@ -0,0 +1,117 @@
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import Counter, Histogram
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "30"))
+NLP_EXECUTOR = os.getenv("NLP_EXECUTOR", "thread").lower()
+NLP_WORKERS = int(os.getenv("NLP_WORKERS", str(min(4, os.cpu_count() or 1))))
+NLP_TIMEOUT = float(os.getenv("NLP_TIMEOUT", "10"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+JOB_SECONDS = Histogram("worker_job_seconds", "Duração de tarefas executadas nos pools de trabalho")
+JOB_TIMEOUTS = Counter("worker_job_timeouts_total", "Tarefas dos pools de trabalho interrompidas por tempo limite")
+JOB_RETRIES = Counter("worker_job_retries_total", "Tarefas repetidas num pool novo após o anterior quebrar")
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Atraso do event loop em relação ao intervalo esperado",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+_pools: Dict[str, Executor] = {}
+_lag_task: Optional[asyncio.Task] = None
+
+
+def _build_pool(kind: str) -> Executor:
+    if kind == "pdf":
+        return ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    if NLP_EXECUTOR == "process":
+        return ProcessPoolExecutor(max_workers=NLP_WORKERS)
+    return ThreadPoolExecutor(max_workers=NLP_WORKERS, thread_name_prefix="nlp")
+
+
+def get_pool(kind: str) -> Executor:
+    pool = _pools.get(kind)
+    if pool is None:
+        pool = _pools[kind] = _build_pool(kind)
+    return pool
+
+
+def _discard_pool(kind: str, terminate: bool = True, pool: Optional[Executor] = None) -> None:
+    """Descarta o pool atual de `kind`; com `pool`, só se ele ainda for o atual (outra tarefa pode já tê-lo trocado)."""
+    if pool is not None and _pools.get(kind) is not pool:
+        return
+    pool = _pools.pop(kind, None)
+    if pool is None:
+        return
+    if terminate and isinstance(pool, ProcessPoolExecutor):
+        # Um processo preso num PDF patológico só é liberado terminando-o.
+        for proc in list(getattr(pool, "_processes", {}).values()):
+            proc.terminate()
+    # Ao terminar, as tarefas ainda na fila falham com BrokenExecutor (e são repetidas) em vez de canceladas.
+    pool.shutdown(wait=False, cancel_futures=not terminate)
+
+
+async def run_in_pool(kind: str, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+    if timeout is None:
+        timeout = PDF_TIMEOUT if kind == "pdf" else NLP_TIMEOUT
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    # Um prazo só para as duas tentativas: a repetição não estende o limite configurado.
+    deadline = loop.time() + timeout
+    try:
+        # Terminar o pool por causa de uma tarefa presa quebra as outras que rodavam nele:
+        # essas são repetidas uma vez num pool novo; só a que estourou o tempo fica sem resultado.
+        # Em thread o tempo limite só abandona a espera: a thread segue ocupando o pool até `fn` terminar.
+        for attempt in range(2):
+            pool = get_pool(kind)
+            call = functools.partial(fn, *args)
+            if isinstance(pool, ThreadPoolExecutor):
+                # Em thread os spans de `fn` chegam ao request_timings da requisição; em processo se perdem,
+                # e o tempo total fica só no span de quem chamou (ex.: "nlp" em _prepare_classification).
+                call = functools.partial(contextvars.copy_context().run, fn, *args)
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(pool, call), timeout=max(0.0, deadline - loop.time())
+                )
+            except asyncio.TimeoutError:
+                JOB_TIMEOUTS.inc(pool=kind)
+                if isinstance(pool, ProcessPoolExecutor):
+                    _discard_pool(kind, pool=pool)
+                raise
+            except BrokenExecutor:
+                _discard_pool(kind, pool=pool)
+                if attempt:
+                    raise
+                JOB_RETRIES.inc(pool=kind)
+    finally:
+        JOB_SECONDS.observe(time.perf_counter() - started, pool=kind)
+
+
+async def _monitor_loop_lag() -> None:
+    while True:
+        expected = time.perf_counter() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG.observe(max(0.0, time.perf_counter() - expected))
+
+
+def start_workers() -> None:
+    global _lag_task
+    get_pool("pdf")
+    get_pool("nlp")
+    if _lag_task is None or _lag_task.done():
+        _lag_task = asyncio.get_running_loop().create_task(_monitor_loop_lag())
+
+
+def stop_workers() -> None:
+    global _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        _lag_task = None
+    for kind in list(_pools):
+        _discard_pool(kind, terminate=False)
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ai_service  # noqa: E402
+from app.cache import cache_bypass  # noqa: E402
+from app.local_classifier import load_labeled  # noqa: E402
+from app.prompts import get_validation_set, get_classification_prompt, get_batch_classification_prompt  # noqa: E402
+from app.scheduler import estimate_tokens  # noqa: E402
+
+
+class _UsageMeter:
+    """Envolve _call_groq para somar o campo usage da API (ou a estimativa, se ausente)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._original = ai_service._call_groq
+
+    async def __call__(self, messages, temperature=0.2, max_tokens=500):
+        j = await self._original(messages, temperature=temperature, max_tokens=max_tokens)
+        usage = (j or {}).get("usage") or {}
+        self.calls += 1
+        self.prompt_tokens += usage.get("prompt_tokens", estimate_tokens(messages))
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        return j
+
+
+async def _measure(nome: str, fn, textos: List[str]) -> Dict:
+    meter = _UsageMeter()
+    ai_service._call_groq = meter
+    try:
+        started = time.perf_counter()
+        await fn(textos)
+        elapsed = time.perf_counter() - started
+    finally:
+        ai_service._call_groq = meter._original
+    n = max(len(textos), 1)
+    return {
+        "modo": nome,
+        "emails": len(textos),
+        "chamadas": meter.calls,
+        "tokens_entrada_por_email": round(meter.prompt_tokens / n, 1),
+        "tokens_saida_por_email": round(meter.completion_tokens / n, 1),
+        "tempo_total_s": round(elapsed, 3),
+    }
+
+
+async def _individual(textos: List[str]) -> None:
+    await asyncio.gather(*(ai_service.classify_one(t) for t in textos))
+
+
+def estimate_only(textos: List[str]) -> List[Dict]:
+    n = max(len(textos), 1)
+    single = sum(estimate_tokens([{"content": get_classification_prompt(t)}]) for t in textos)
+    batched = sum(
+        estimate_tokens([{"content": get_batch_classification_prompt([textos[i] for i in chunk])}])
+        for chunk in ai_service.plan_batches(textos)
+    )
+    return [
+        {"modo": "individual (estimado)", "emails": len(textos), "tokens_entrada_por_email": round(single / n, 1)},
+        {"modo": "lote (estimado)", "emails": len(textos), "tokens_entrada_por_email": round(batched / n, 1)},
+    ]
+
+
+async def run(textos: List[str]) -> List[Dict]:
+    if not ai_service._llm_enabled():
+        return estimate_only(textos)
+    cache_bypass.set(True)
+    return [
+        await _measure("individual", _individual, textos),
+        await _measure("lote", ai_service.classify_batch, textos),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara classificação individual vs. em lote (tokens/email e tempo)")
+    parser.add_argument("--data", help="JSONL/CSV rotulado; padrão: prompts.VALIDATION_SET")
+    parser.add_argument("--repeat", type=int, default=4, help="repete o conjunto para formar lotes maiores")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    base = load_labeled(args.data) if args.data else get_validation_set()
+    textos = [it["email"] for it in base] * args.repeat
+    results = asyncio.run(run(textos))
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        for r in results:
+            print(" | ".join(f"{k}: {v}" for k, v in r.items()))
@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["app.nlp_processor", "app.main"]
+
+
+def time_import(module: str, runs: int) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, check=True)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run(runs: int) -> Dict[str, Dict[str, float]]:
+    baseline = time_import("sys", runs)
+    results = {}
+    for module in MODULES:
+        samples = time_import(module, runs)
+        results[module] = {
+            "mediana_s": round(statistics.median(samples), 4),
+            "min_s": round(min(samples), 4),
+            "max_s": round(max(samples), 4),
+            "acima_do_interpretador_s": round(statistics.median(samples) - statistics.median(baseline), 4),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o tempo de import (cold start) dos módulos da aplicação")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for module, r in results.items():
+            print(f"{module:<22} mediana {r['mediana_s']:.3f}s  (+{r['acima_do_interpretador_s']:.3f}s sobre o interpretador)")
@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import math
+import time
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+_PALAVRAS = (
+    "prezados solicito status chamado reembolso contrato prazo reunião sistema erro acesso fatura "
+    "boleto atualização cadastro equipe obrigado aguardo retorno urgente financeiro suporte relatório"
+).split()
+
+
+def _texto(rng: random.Random, chars: int) -> str:
+    palavras = []
+    total = 0
+    while total < chars:
+        p = rng.choice(_PALAVRAS)
+        palavras.append(p)
+        total += len(p) + 1
+    return " ".join(palavras)[:chars]
+
+
+def make_pdf(pages: int, lines_per_page: int = 40, seed: int = 0) -> bytes:
+    """PDF mínimo com texto extraível (Helvetica), sem dependências externas."""
+    rng = random.Random(seed)
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # páginas, preenchido abaixo
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for _ in range(pages):
+        linhas = "".join(f"({_texto(rng, 80)}) Tj T* " for _ in range(lines_per_page))
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {linhas}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _rate(fn: Callable[[Any], Any], inputs: List[Any], repeticoes: int) -> Tuple[float, float]:
+    """Mediana de ops/s e de ms/op entre as repetições."""
+    taxas = []
+    for _ in range(repeticoes):
+        started = time.perf_counter()
+        for x in inputs:
+            fn(x)
+        taxas.append(len(inputs) / (time.perf_counter() - started))
+    taxa = statistics.median(taxas)
+    return taxa, 1000.0 / taxa
+
+
+def _metric(valor: float, unidade: str, maior_melhor: bool = True) -> Dict[str, Any]:
+    return {"valor": round(valor, 4), "unidade": unidade, "maior_melhor": maior_melhor}
+
+
+def bench_preprocess(repeticoes: int, tamanhos: List[int]) -> Dict[str, Dict[str, Any]]:
+    from app import nlp_processor
+
+    nlp_processor.ensure_resources()
+    rng = random.Random(1)
+    resultados = {}
+    for chars in tamanhos:
+        n = max(5, min(200, 200_000 // chars))
+        lotes = [[f"{_texto(rng, chars)} #{r}-{i}" for i in range(n)] for r in range(repeticoes)]
+        taxas = []
+        for lote in lotes:
+            # Textos inéditos a cada repetição: mede o pipeline, não o memo de analyze_email.
+            started = time.perf_counter()
+            for t in lote:
+                nlp_processor.preprocess_email(t)
+            taxas.append(len(lote) / (time.perf_counter() - started))
+        taxa = statistics.median(taxas)
+        resultados[f"preprocess_email.{chars}c.emails_s"] = _metric(taxa, "emails/s")
+        resultados[f"preprocess_email.{chars}c.mb_s"] = _metric(taxa * chars / 1e6, "MB/s")
+    return resultados
+
+
+def bench_pdf(repeticoes: int) -> Dict[str, Dict[str, Any]]:
+    from app.file_processor import extract_text_from_file
+
+    casos = {"pequeno": make_pdf(1, seed=1), "grande": make_pdf(50, seed=2)}
+    resultados = {}
+    for nome, data in casos.items():
+        n = 20 if nome == "pequeno" else 3
+        _, ms = _rate(lambda d: extract_text_from_file(d, "bench.pdf"), [data] * n, repeticoes)
+        resultados[f"extract_text_from_file.pdf_{nome}.ms"] = _metric(ms, "ms/arquivo", maior_melhor=False)
+    return resultados
+
+
+def bench_parse(repeticoes: int) -> Dict[str, Dict[str, Any]]:
+    from app.ai_service import _parse_classification
+
+    limpo = '{"categoria": "PRODUTIVO", "confianca": 92, "razao": "Solicitação de status de reembolso."}'
+    baguncado = (
+        "Claro! Segue a classificação solicitada:\n\n```json\n"
+        '{\n  "categoria": "produtivo",\n  "confianca": "87.5",\n  "razao": "Pedido com prazo"\n}\n'
+        "```\n\nEspero ter ajudado. " + "Observação adicional. " * 20
+    )
+    invalido = "Não consigo classificar este email com as informações fornecidas. " * 5
+    resultados = {}
+    for nome, texto in (("limpo", limpo), ("baguncado", baguncado), ("invalido", invalido)):
+        taxa, _ = _rate(_parse_classification, [texto] * 5000, repeticoes)
+        resultados[f"_parse_classification.{nome}.ops_s"] = _metric(taxa, "ops/s")
+    return resultados
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url: str, timeout: float = 60.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Servidor não respondeu: {url}")
+
+
+def _percentil(amostras: List[float], p: float) -> float:
+    ordenadas = sorted(amostras)
+    k = min(len(ordenadas) - 1, max(0, math.ceil(p / 100.0 * len(ordenadas)) - 1))
+    return ordenadas[k]
+
+
+async def _carga(url: str, concorrencia: int, requisicoes: int, arquivos: int) -> Dict[str, float]:
+    import httpx
+
+    rng = random.Random(concorrencia * 1000 + arquivos)
+    latencias: List[float] = []
+    erros = 0
+    fila = list(range(requisicoes))
+
+    async def cliente(http: "httpx.AsyncClient") -> None:
+        nonlocal erros
+        while fila:
+            fila.pop()
+            # Textos inéditos: sem acertos de cache nem deduplicação entre requisições.
+            files = [
+                ("arquivo", (f"email{i}.txt", _texto(rng, 600).encode("utf-8"), "text/plain"))
+                for i in range(arquivos)
+            ]
+            started = time.perf_counter()
+            resp = await http.post(url, files=files)
+            latencias.append(time.perf_counter() - started)
+            if resp.status_code != 200:
+                erros += 1
+
+    async with httpx.AsyncClient(timeout=120.0) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(cliente(http) for _ in range(concorrencia)))
+        total = time.perf_counter() - started
+
+    return {
+        "req_s": requisicoes / total,
+        "emails_s": requisicoes * arquivos / total,
+        "p50_ms": _percentil(latencias, 50) * 1000,
+        "p95_ms": _percentil(latencias, 95) * 1000,
+        "p99_ms": _percentil(latencias, 99) * 1000,
+        "erros": erros,
+    }
+
+
+def bench_e2e(
+    concorrencias: List[int], arquivos: List[int], requisicoes: int, latencia_ms: float
+) -> Dict[str, Dict[str, Any]]:
+    stub_port, app_port = _free_port(), _free_port()
+    env = dict(
+        os.environ,
+        LLM_BASE_URL=f"http://127.0.0.1:{stub_port}/v1",
+        LLM_API_KEY="",
+        GROQ_API_KEY="",
+        LLM_CACHE_ENABLED="false",
+        LLM_REQUESTS_PER_MINUTE=os.getenv("LLM_REQUESTS_PER_MINUTE", "100000"),
+        LLM_TOKENS_PER_MINUTE=os.getenv("LLM_TOKENS_PER_MINUTE", "100000000"),
+    )
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "app.llm_stub", "--port", str(stub_port),
+         "--latencia-ms", str(latencia_ms), "--seed", "42"],
+        cwd=ROOT, env=env,
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    resultados = {}
+    try:
+        _wait_http(f"http://127.0.0.1:{stub_port}/v1/models")
+        _wait_http(f"http://127.0.0.1:{app_port}/metrics")
+        url = f"http://127.0.0.1:{app_port}/process"
+        for n_arquivos in arquivos:
+            for conc in concorrencias:
+                r = asyncio.run(_carga(url, conc, max(requisicoes, conc), n_arquivos))
+                prefixo = f"process.c{conc}.f{n_arquivos}"
+                resultados[f"{prefixo}.req_s"] = _metric(r["req_s"], "req/s")
+                resultados[f"{prefixo}.emails_s"] = _metric(r["emails_s"], "emails/s")
+                for p in ("p50_ms", "p95_ms", "p99_ms"):
+                    resultados[f"{prefixo}.{p}"] = _metric(r[p], "ms", maior_melhor=False)
+                resultados[f"{prefixo}.erros"] = _metric(r["erros"], "requisições", maior_melhor=False)
+    finally:
+        for proc in (server, stub):
+            proc.terminate()
+            proc.wait(timeout=10)
+    return resultados
+
+
+def compare(atual: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerancia: float) -> List[str]:
+    regressoes = []
+    for nome, base in baseline.items():
+        r = atual.get(nome)
+        if r is None:
+            continue
+        if not base["valor"]:
+            if not base.get("maior_melhor", True) and r["valor"] > 0:
+                regressoes.append(f"{nome}: 0 -> {r['valor']} {r['unidade']}")
+            continue
+        variacao = (r["valor"] - base["valor"]) / abs(base["valor"])
+        pior = -variacao if base.get("maior_melhor", True) else variacao
+        if pior > tolerancia:
+            regressoes.append(
+                f"{nome}: {base['valor']} -> {r['valor']} {r['unidade']} ({variacao * 100:+.1f}%)"
+            )
+    return regressoes
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    etapas = set(args.etapas)
+    resultados: Dict[str, Dict[str, Any]] = {}
+    if "nlp" in etapas:
+        resultados.update(bench_preprocess(args.repeticoes, args.tamanhos))
+    if "pdf" in etapas:
+        resultados.update(bench_pdf(args.repeticoes))
+    if "parse" in etapas:
+        resultados.update(bench_parse(args.repeticoes))
+    if "e2e" in etapas:
+        resultados.update(bench_e2e(args.concorrencias, args.arquivos, args.requisicoes, args.latencia_ms))
+    return {
+        "meta": {
+            "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "resultados": resultados,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos caminhos críticos e carga ponta a ponta em /process")
+    parser.add_argument("--etapas", nargs="+", choices=["nlp", "pdf", "parse", "e2e"], default=["nlp", "pdf", "parse", "e2e"])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[200, 2000, 20000], help="tamanhos de email (caracteres)")
+    parser.add_argument("--concorrencias", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--arquivos", type=int, nargs="+", default=[1, 5], help="arquivos por requisição")
+    parser.add_argument("--requisicoes", type=int, default=64, help="requisições por cenário de carga")
+    parser.add_argument("--latencia-ms", type=float, default=200.0, help="latência média do stub de LLM")
+    parser.add_argument("--saida", default=None, help="grava o resultado em JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava o resultado como nova baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="piora relativa tolerada antes de acusar regressão")
+    args = parser.parse_args()
+
+    relatorio = run(args)
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    for nome, r in relatorio["resultados"].items():
+        print(f"{nome:<45} {r['valor']:>12.3f} {r['unidade']}")
+
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+        print(f"Baseline gravada em {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["resultados"]
+        regressoes = compare(relatorio["resultados"], baseline, args.tolerancia)
+        if regressoes:
+            print(f"\nRegressões acima de {args.tolerancia * 100:.0f}% em relação à baseline:")
+            for linha in regressoes:
+                print(f"  {linha}")
+            raise SystemExit(1)
+        print("\nSem regressões em relação à baseline.")
@@ -75,6 +75,7 @@ document.addEventListener("DOMContentLoaded", () => {
     }
 
     const resposta = raw.resposta ?? raw.response ?? raw.answer ?? "";
+    const status = raw.status ?? "ok";
 
     return {
       arquivo,
@@ -83,21 +84,34 @@ document.addEventListener("DOMContentLoaded", () => {
         confianca: Number(confianca) || 0,
         razao: String(razao || "")
       },
-      resposta: String(resposta || "")
+      resposta: String(resposta || ""),
+      status: String(status),
+      duplicadoDe: raw.duplicado_de ?? raw.duplicadoDe ?? null,
+      indice: raw.indice ?? null,
+      gerando: Boolean(raw.gerando)
     };
   }
 
+  function tagFor(it) {
+    if (it.status !== "ok") return { cls: "erro", label: it.status.replaceAll("_", " ").toUpperCase() };
+    return { cls: it.classificacao.categoria.toLowerCase(), label: it.classificacao.categoria };
+  }
+
+  function isImprodutivo(it) {
+    return it.status === "ok" && it.classificacao.categoria !== "PRODUTIVO";
+  }
+
   function renderResultadoAtual(list) {
     ultimoResultados = list.map(normalizeItem);
 
     let exibidos = ultimoResultados;
     if (filtroAtual !== "all") {
-      exibidos = ultimoResultados.filter(it => it.classificacao.categoria === filtroAtual);
+      exibidos = ultimoResultados.filter(it => it.status === "ok" && it.classificacao.categoria === filtroAtual);
     }
 
     const total = ultimoResultados.length;
-    const prod = ultimoResultados.filter(i => i.classificacao.categoria === "PRODUTIVO").length;
-    const impr = total - prod;
+    const prod = ultimoResultados.filter(i => i.status === "ok" && i.classificacao.categoria === "PRODUTIVO").length;
+    const impr = ultimoResultados.filter(isImprodutivo).length;
 
     statAtualTotal.innerText = total;
     statAtualProd.innerText = prod;
@@ -111,13 +125,15 @@ document.addEventListener("DOMContentLoaded", () => {
     resultadoDiv.innerHTML = "";
     exibidos.forEach((it) => {
       const card = document.createElement("div");
+      const tag = tagFor(it);
       card.className = "resultado-item";
       card.innerHTML = `
-        <h3>📄 ${escapeHtml(it.arquivo)} — <span class="tag ${it.classificacao.categoria.toLowerCase()}">${it.classificacao.categoria}</span></h3>
+        <h3>📄 ${escapeHtml(it.arquivo)} — <span class="tag ${escapeHtml(tag.cls)}">${escapeHtml(tag.label)}</span></h3>
         <pre><code>${escapeHtml(JSON.stringify(it.classificacao, null, 2))}</code></pre>
         <p>Confiança: ${it.classificacao.confianca}%</p>
-        <button class="toggle-response">▶ Resposta sugerida</button>
-        <div class="resposta-box hidden">${escapeHtml(it.resposta)}</div>
+        ${it.duplicadoDe ? `<p>Resultado reaproveitado de ${escapeHtml(it.duplicadoDe)} (conteúdo duplicado).</p>` : ""}
+        <button class="toggle-response">${it.gerando ? "▼ Ocultar resposta" : "▶ Resposta sugerida"}</button>
+        <div class="resposta-box ${it.gerando ? "" : "hidden"}" data-indice="${it.indice ?? ""}">${escapeHtml(it.resposta)}</div>
       `;
       const btn = card.querySelector(".toggle-response");
       const box = card.querySelector(".resposta-box");
@@ -141,8 +157,8 @@ document.addEventListener("DOMContentLoaded", () => {
 
     const allItems = historico.flatMap(h => h.resultados.map(normalizeItem));
     statHistTotal.innerText = allItems.length;
-    statHistProd.innerText = allItems.filter(i => i.classificacao.categoria === "PRODUTIVO").length;
-    statHistImprod.innerText = allItems.filter(i => i.classificacao.categoria !== "PRODUTIVO").length;
+    statHistProd.innerText = allItems.filter(i => i.status === "ok" && i.classificacao.categoria === "PRODUTIVO").length;
+    statHistImprod.innerText = allItems.filter(isImprodutivo).length;
 
     const inicio = paginaHistorico * HIST_PAGE_SIZE;
     const fim = inicio + HIST_PAGE_SIZE;
@@ -154,9 +170,10 @@ document.addEventListener("DOMContentLoaded", () => {
       const item = document.createElement("div");
       item.className = "historico-item";
 
-      const total = exec.resultados.length;
-      const prod = exec.resultados.filter(r => (r.categoria ?? r.classificacao?.categoria ?? "").toUpperCase() === "PRODUTIVO").length;
-      const impr = total - prod;
+      const execItems = exec.resultados.map(normalizeItem);
+      const total = execItems.length;
+      const prod = execItems.filter(i => i.status === "ok" && i.classificacao.categoria === "PRODUTIVO").length;
+      const impr = execItems.filter(isImprodutivo).length;
 
       item.innerHTML = `
         <h4>🕒 ${escapeHtml(exec.timestamp)}</h4>
@@ -176,7 +193,7 @@ document.addEventListener("DOMContentLoaded", () => {
               const n = normalizeItem(r);
               return `
                 <div class="resultado-item mini">
-                  <strong>📄 ${escapeHtml(n.arquivo)} — ${n.classificacao.categoria}</strong>
+                  <strong>📄 ${escapeHtml(n.arquivo)} — ${escapeHtml(tagFor(n).label)}</strong>
                   <pre><code>${escapeHtml(JSON.stringify(n.classificacao, null, 2))}</code></pre>
                   <details><summary>📩 Resposta sugerida</summary><div>${escapeHtml(n.resposta)}</div></details>
                 </div>
@@ -228,6 +245,25 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
+  async function readNdjson(resp, onRecord) {
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let nl;
+      while ((nl = buffer.indexOf("\n")) >= 0) {
+        const line = buffer.slice(0, nl).trim();
+        buffer = buffer.slice(nl + 1);
+        if (line) onRecord(JSON.parse(line));
+      }
+    }
+    buffer += decoder.decode();
+    if (buffer.trim()) onRecord(JSON.parse(buffer));
+  }
+
   function escapeHtml(s) {
     if (!s && s !== 0) return "";
     return String(s).replaceAll("&", "&amp;").replaceAll("<", "&lt;").replaceAll(">", "&gt;");
@@ -243,26 +279,62 @@ document.addEventListener("DOMContentLoaded", () => {
     files.forEach(f => fd.append("arquivo", f));
 
     loader.classList.remove("hidden");
+    loader.textContent = "⏳ Processando...";
     resultadoDiv.innerHTML = "";
 
     try {
-      const resp = await fetch("/process", { method: "POST", body: fd });
+      const resp = await fetch("/process/stream?parcial=true", { method: "POST", body: fd });
       if (!resp.ok) {
         const txt = await resp.text();
         throw new Error(txt || `Status ${resp.status}`);
       }
 
-      const data = await resp.json();
-      let resultadosRaw = [];
-      if (Array.isArray(data)) resultadosRaw = data;
-      else if (Array.isArray(data.resultados)) resultadosRaw = data.resultados;
-
       filtroAtual = "all"; // reset filtro
-      renderResultadoAtual(resultadosRaw);
+      const resultadosRaw = [];
+      // Emails já classificados cuja resposta ainda está sendo gerada, por índice.
+      const emAndamento = new Map();
+      const visiveis = () => resultadosRaw.concat(Array.from(emAndamento.values()));
+      let totalEsperado = 0;
+      let erroStream = null;
+
+      await readNdjson(resp, (registro) => {
+        if (registro.tipo === "inicio") {
+          totalEsperado = registro.total;
+          loader.textContent = `⏳ Processando... 0/${totalEsperado}`;
+        } else if (registro.tipo === "classificacao") {
+          emAndamento.set(registro.indice, {
+            indice: registro.indice,
+            arquivo: registro.arquivo,
+            classificacao: registro.classificacao,
+            resposta: "",
+            gerando: true
+          });
+          renderResultadoAtual(visiveis());
+        } else if (registro.tipo === "resposta_parcial") {
+          const parcial = emAndamento.get(registro.indice);
+          if (!parcial) return;
+          parcial.resposta += registro.delta;
+          // Atualiza só a caixa da resposta, sem redesenhar os cards a cada pedaço.
+          const box = resultadoDiv.querySelector(`.resposta-box[data-indice="${registro.indice}"]`);
+          if (box) box.textContent = parcial.resposta;
+        } else if (registro.tipo === "resultado") {
+          emAndamento.delete(registro.indice);
+          resultadosRaw.push(registro.resultado);
+          loader.textContent = `⏳ Processando... ${resultadosRaw.length}/${totalEsperado}`;
+          renderResultadoAtual(visiveis());
+        } else if (registro.tipo === "erro") {
+          erroStream = registro.detalhe;
+        }
+      });
 
-      historico.unshift({ timestamp: new Date().toLocaleString(), resultados: resultadosRaw });
-      paginaHistorico = 0;
-      renderHistorico();
+      if (resultadosRaw.length) {
+        historico.unshift({ timestamp: new Date().toLocaleString(), resultados: resultadosRaw });
+        paginaHistorico = 0;
+        renderHistorico();
+      }
+      if (erroStream) {
+        resultadoDiv.insertAdjacentHTML("beforeend", `<p style="color:red">Erro no processamento: ${escapeHtml(erroStream)}</p>`);
+      }
 
       form.reset();
       fileInfo.innerText = "";
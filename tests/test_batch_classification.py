@@ -0,0 +1,39 @@
+import json
+
+from app.ai_service import _parse_batch_classification
+
+
+def _entrada(id_, categoria):
+    entry = {"categoria": categoria, "confianca": 90, "razao": ""}
+    if id_ is not None:
+        entry["id"] = id_
+    return entry
+
+
+def _categorias(resultados):
+    return [r and r["categoria"] for r in resultados]
+
+
+def test_ids_1_a_n_posicionam_pelo_id():
+    raw = json.dumps([_entrada(2, "PRODUTIVO"), _entrada(1, "IMPRODUTIVO"), _entrada(3, "PRODUTIVO")])
+    assert _categorias(_parse_batch_classification(raw, 3)) == ["IMPRODUTIVO", "PRODUTIVO", "PRODUTIVO"]
+
+
+def test_ids_comecando_em_zero_usam_a_posicao():
+    raw = json.dumps([_entrada(0, "IMPRODUTIVO"), _entrada(1, "PRODUTIVO"), _entrada(2, "PRODUTIVO")])
+    assert _categorias(_parse_batch_classification(raw, 3)) == ["IMPRODUTIVO", "PRODUTIVO", "PRODUTIVO"]
+
+
+def test_sem_ids_usa_a_posicao():
+    raw = json.dumps([_entrada(None, "PRODUTIVO"), _entrada(None, "IMPRODUTIVO")])
+    assert _categorias(_parse_batch_classification(raw, 2)) == ["PRODUTIVO", "IMPRODUTIVO"]
+
+
+def test_ids_invalidos_e_tamanho_diferente_vao_para_o_fallback():
+    raw = json.dumps([_entrada(0, "IMPRODUTIVO"), _entrada(1, "PRODUTIVO")])
+    assert _parse_batch_classification(raw, 3) == [None, None, None]
+
+
+def test_entrada_invalida_fica_sem_resultado():
+    raw = json.dumps([_entrada(1, "PRODUTIVO"), _entrada(2, "TALVEZ"), {"id": 3, "categoria": "PRODUTIVO"}])
+    assert _categorias(_parse_batch_classification(raw, 3)) == ["PRODUTIVO", None, None]
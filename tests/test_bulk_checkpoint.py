@@ -0,0 +1,80 @@
+import csv
+import json
+import asyncio
+
+import pytest
+
+from app import bulk
+
+
+@pytest.fixture
+def entrada(tmp_path):
+    pasta = tmp_path / "entrada"
+    pasta.mkdir()
+    for i in range(5):
+        (pasta / f"m{i}.txt").write_text(f"email {i}: preciso da segunda via do boleto", encoding="utf-8")
+    return str(pasta)
+
+
+@pytest.fixture
+def falhas(monkeypatch):
+    """Ids que o `process_texts` falso devolve com status erro; o resto sai ok."""
+    falhar = set()
+
+    async def process_texts(items):
+        it = items[0]
+        return [{
+            "arquivo": it["arquivo"],
+            "classificacao": {"categoria": "PRODUTIVO", "confianca": 90, "razao": 'linha 1,\n"linha 2"'},
+            "resposta": "ok",
+            "status": "erro" if it["arquivo"] in falhar else "ok",
+        }]
+
+    monkeypatch.setattr(bulk, "process_texts", process_texts)
+    return falhar
+
+
+def _rodar(entrada, saida):
+    asyncio.run(bulk.run_bulk(entrada, saida, intervalo=3600))
+
+
+def _ids_jsonl(saida):
+    with open(saida, encoding="utf-8") as f:
+        return [(r["id"], r["status"]) for r in map(json.loads, f)]
+
+
+def test_retomar_pula_concluidos_e_repete_erros(entrada, falhas, tmp_path):
+    saida = str(tmp_path / "saida.jsonl")
+    falhas.update({"m1.txt", "m3.txt"})
+    _rodar(entrada, saida)
+    assert sorted(_ids_jsonl(saida)) == [
+        ("m0.txt", "ok"), ("m1.txt", "erro"), ("m2.txt", "ok"), ("m3.txt", "erro"), ("m4.txt", "ok"),
+    ]
+
+    falhas.clear()
+    _rodar(entrada, saida)
+    ids = _ids_jsonl(saida)
+    assert sorted(ids) == [(f"m{i}.txt", "ok") for i in range(5)]
+    # Só os que tinham falhado foram reprocessados; os concluídos continuam na frente.
+    assert {i for i, _ in ids[-2:]} == {"m1.txt", "m3.txt"}
+
+
+def test_retomar_descarta_linha_escrita_pela_metade(entrada, falhas, tmp_path):
+    saida = str(tmp_path / "saida.jsonl")
+    _rodar(entrada, saida)
+    with open(saida, "a", encoding="utf-8") as f:
+        f.write('{"id": "m9.txt", "arqu')
+    _rodar(entrada, saida)
+    assert sorted(_ids_jsonl(saida)) == [(f"m{i}.txt", "ok") for i in range(5)]
+
+
+def test_retomar_csv_mantem_cabecalho_e_campos_multilinha(entrada, falhas, tmp_path):
+    saida = str(tmp_path / "saida.csv")
+    falhas.add("m2.txt")
+    _rodar(entrada, saida)
+    falhas.clear()
+    _rodar(entrada, saida)
+    with open(saida, encoding="utf-8", newline="") as f:
+        linhas = list(csv.DictReader(f))
+    assert sorted((r["id"], r["status"]) for r in linhas) == [(f"m{i}.txt", "ok") for i in range(5)]
+    assert all(r["razao"] == 'linha 1,\n"linha 2"' for r in linhas)
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from app.cache import ResultCache, cache_bypass
+
+
+def test_chamadas_identicas_simultaneas_calculam_uma_vez():
+    cache = ResultCache(max_entries=10, ttl=60)
+    chamadas = []
+
+    async def factory():
+        chamadas.append(1)
+        await asyncio.sleep(0.01)
+        return {"categoria": "PRODUTIVO"}
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("k", factory) for _ in range(5)))
+
+    resultados = asyncio.run(main())
+    assert len(chamadas) == 1
+    assert resultados == [{"categoria": "PRODUTIVO"}] * 5
+
+
+def test_erro_chega_a_todos_e_nao_fica_no_cache():
+    cache = ResultCache(max_entries=10, ttl=60)
+    chamadas = []
+
+    async def falha():
+        chamadas.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("429")
+
+    async def main():
+        resultados = await asyncio.gather(*(cache.get_or_compute("k", falha) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in resultados)
+        assert await cache.get_or_compute("k", lambda: asyncio.sleep(0, result="ok")) == "ok"
+
+    asyncio.run(main())
+    assert len(chamadas) == 1
+
+
+def test_cancelar_quem_calcula_nao_derruba_quem_espera():
+    cache = ResultCache(max_entries=10, ttl=60)
+
+    async def lenta():
+        await asyncio.sleep(1)
+        return "lento"
+
+    async def main():
+        dono = asyncio.ensure_future(cache.get_or_compute("k", lenta))
+        await asyncio.sleep(0)
+        seguidor = asyncio.ensure_future(cache.get_or_compute("k", lambda: asyncio.sleep(0, result="novo")))
+        await asyncio.sleep(0)
+        dono.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await dono
+        return await seguidor
+
+    assert asyncio.run(main()) == "novo"
+
+
+def test_should_store_e_bypass():
+    cache = ResultCache(max_entries=10, ttl=60)
+    chamadas = []
+
+    async def factory():
+        chamadas.append(1)
+        return {"status": "erro"}
+
+    async def main():
+        await cache.get_or_compute("k", factory, should_store=lambda v: v["status"] == "ok")
+        await cache.get_or_compute("k", factory, should_store=lambda v: v["status"] == "ok")
+        cache_bypass.set(True)
+        await cache.get_or_compute("k", factory)
+
+    asyncio.run(main())
+    assert len(chamadas) == 3
+
+
+def test_camada_sqlite_sobrevive_a_memoria(tmp_path):
+    caminho = str(tmp_path / "cache.db")
+
+    async def main():
+        await ResultCache(max_entries=10, ttl=60, db_path=caminho).set("k", {"v": 1})
+        return await ResultCache(max_entries=10, ttl=60, db_path=caminho).get("k")
+
+    assert asyncio.run(main()) == {"v": 1}
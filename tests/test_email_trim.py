@@ -0,0 +1,50 @@
+from app.email_trim import trim_email
+
+
+def test_aviso_no_corpo_nao_corta():
+    texto = "Olá equipe,\n\nAviso: o sistema ficará fora do ar amanhã às 10h. Precisamos que salvem tudo."
+    assert trim_email(texto) == texto
+
+
+def test_linhas_de_e_para_sem_cabecalho_nao_cortam():
+    texto = "Bom dia,\nDe: segunda a sexta o suporte atende.\nPara: dúvidas ligue 1234.\nObrigado"
+    assert trim_email(texto) == texto
+
+
+def test_escreveu_sem_data_nem_endereco_nao_corta():
+    texto = "Pessoal, segue a planilha.\nEm caso de dúvidas, procurem o Pedro que escreveu: o documento."
+    assert trim_email(texto) == texto
+
+
+def test_atribuicao_com_data_corta_historico():
+    texto = "Pode enviar o boleto?\n\nEm qua., 5 de jun. de 2024 às 10:12, Ana <ana@x.com> escreveu:\n> texto antigo"
+    assert trim_email(texto) == "Pode enviar o boleto?"
+
+
+def test_atribuicao_em_ingles_corta_historico():
+    texto = "Can you send it?\n\nOn Wed, Jun 5, 2024 at 10:12 AM Ana <ana@x.com> wrote:\n> old"
+    assert trim_email(texto) == "Can you send it?"
+
+
+def test_bloco_de_cabecalho_do_outlook_corta_historico():
+    texto = (
+        "Segue o contrato.\n\n"
+        "De: Ana Souza <ana@x.com>\nEnviado: quarta-feira, 5 de junho de 2024 10:12\n"
+        "Para: Bruno\nAssunto: contrato\n\nmensagem antiga"
+    )
+    assert trim_email(texto) == "Segue o contrato."
+
+
+def test_aviso_legal_no_fim_corta():
+    texto = "Preciso do relatório.\n\nAVISO LEGAL: Esta mensagem é confidencial e destinada apenas ao destinatário."
+    assert trim_email(texto) == "Preciso do relatório."
+
+
+def test_aviso_legal_seguido_de_muito_texto_nao_corta():
+    texto = "Oi,\n\nAVISO LEGAL: segue o novo modelo.\n" + "\n".join(f"item {i}" for i in range(30))
+    assert trim_email(texto) == texto
+
+
+def test_assinatura_formal_e_rodape_de_celular():
+    texto = "Qual o prazo de entrega?\n\nAtenciosamente,\nAna Souza\nFinanceiro\n\nEnviado do meu iPhone"
+    assert trim_email(texto) == "Qual o prazo de entrega?"
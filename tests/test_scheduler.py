@@ -0,0 +1,76 @@
+import asyncio
+
+from app.scheduler import LLMScheduler
+
+
+def _sem_limite_de_taxa(max_in_flight=1):
+    return LLMScheduler(max_in_flight=max_in_flight, requests_per_minute=0, tokens_per_minute=0)
+
+
+def test_filas_por_requisicao_sao_atendidas_em_rodizio():
+    scheduler = _sem_limite_de_taxa()
+    ordem = []
+
+    async def chamada(chave, n):
+        async with scheduler.slot(1, key=chave):
+            ordem.append(f"{chave}{n}")
+            await asyncio.sleep(0)
+
+    async def main():
+        tarefas = [asyncio.ensure_future(chamada("a", i)) for i in range(4)]
+        await asyncio.sleep(0)
+        tarefas += [asyncio.ensure_future(chamada("b", i)) for i in range(2)]
+        await asyncio.gather(*tarefas)
+
+    asyncio.run(main())
+    # A requisição "b" chega depois de "a" ter enfileirado tudo e mesmo assim não espera a fila inteira.
+    assert ordem.index("b1") < ordem.index("a3")
+    assert [x for x in ordem if x.startswith("a")] == ["a0", "a1", "a2", "a3"]
+
+
+def test_limite_de_chamadas_simultaneas():
+    scheduler = _sem_limite_de_taxa(max_in_flight=2)
+    ativas = []
+    pico = []
+
+    async def chamada():
+        async with scheduler.slot(1, key="x"):
+            ativas.append(1)
+            pico.append(len(ativas))
+            await asyncio.sleep(0.01)
+            ativas.pop()
+
+    async def main():
+        await asyncio.gather(*(chamada() for _ in range(6)))
+
+    asyncio.run(main())
+    assert max(pico) == 2
+
+
+def test_cancelar_na_fila_libera_a_vez():
+    scheduler = _sem_limite_de_taxa()
+
+    async def main():
+        ocupada = asyncio.Event()
+        soltar = asyncio.Event()
+
+        async def segura():
+            async with scheduler.slot(1, key="a"):
+                ocupada.set()
+                await soltar.wait()
+
+        async def rapida():
+            async with scheduler.slot(1, key="c"):
+                return "ok"
+
+        primeira = asyncio.ensure_future(segura())
+        await ocupada.wait()
+        esperando = asyncio.ensure_future(rapida())
+        await asyncio.sleep(0)
+        esperando.cancel()
+        soltar.set()
+        await primeira
+        assert scheduler.queue_depth == 0
+        assert await asyncio.wait_for(rapida(), timeout=1) == "ok"
+
+    asyncio.run(main())